@@ -0,0 +1,379 @@
+'''
+    ai.py
+    The computer player. It works on a GameState from state.py instead of the graphics
+    board, so it can run without a window. The sizes of chains and loops come from the
+    analyzer in chains.py, which is kept up to date between moves.
+'''
+import random
+import weakref
+
+import chains
+import endgame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#boards with fewer edges than this are sorted in plain Python, numpy only pays off on bigger ones
+NUMPY_MIN_EDGES = 200
+_numpy_pairs = {}
+
+
+def get_rng(rng):
+    '''Returns the random number generator to use: the one given, a new one seeded with
+        the number given, or the random module itself when nothing is given.
+    '''
+    if rng is None:
+        return random
+    if isinstance(rng, int):
+        return random.Random(rng)
+    return rng
+
+def find_move(state, rng=None):
+    '''This function sorts the undrawn edges with classify_moves. If an edge can complete a
+        square it is drawn. Otherwise it finds the edge with the least number of neighbors drawn.
+        Returns the edge to draw. rng picks between equally good edges, pass a seeded
+        random.Random (or a seed) to get the same moves every run.
+    '''
+    rng = get_rng(rng)
+    noNeighbors, oneNeighbors, twoNeighbors, captures = classify_moves(state)
+    if captures:
+        edge = captures[0]
+        #when only chains and loops are left the endgame is played exactly
+        exact = endgame.find_move(state)
+        if exact is not None:
+            return exact
+        if double_cross_check(state, edge):
+            cross = double_cross_play(state, edge)
+            if cross is not None:
+                return cross
+        return edge
+    #for minimum neighbors of 0 or 1 we pick a random place to draw line
+    if noNeighbors:
+        return noNeighbors[rng.randint(0, len(noNeighbors) - 1)]
+    if oneNeighbors:
+        return oneNeighbors[rng.randint(0, len(oneNeighbors) - 1)]
+    #Every move gives boxes away, so the endgame solver picks what to open. If the board is
+    #not only chains and loops it finds the move where the opponent completes the least squares
+    edge = endgame.find_move(state)
+    if edge is None:
+        edge = forced_move(state, twoNeighbors)
+    return edge
+
+def classify_moves(state):
+    '''Sorts the undrawn edges by neighbor_count into four lists, in edge order: edges
+        with no neighbors drawn and with one (safe to draw), with two (they give boxes away)
+        and with three (they complete a square). On big boards this is done for all the
+        edges at once with numpy when it is installed.
+    '''
+    if numpy is not None and state.num_edges >= NUMPY_MIN_EDGES:
+        return classify_moves_numpy(state)
+    return classify_moves_python(state)
+
+def classify_moves_python(state):
+    #the plain Python version of classify_moves, one edge at a time
+    levels = ([], [], [], [])
+    sides = state.sides
+    edge_boxes = state.edge_boxes
+    for edge in state.legal_moves():
+        boxes = edge_boxes[edge]
+        count = sides[boxes[0]]
+        if len(boxes) == 2 and sides[boxes[1]] > count:
+            count = sides[boxes[1]]
+        levels[count].append(edge)
+    return levels
+
+def classify_moves_numpy(state):
+    #the numpy version of classify_moves, it gives the same lists
+    pairs = _numpy_pairs.get((state.rows, state.columns))
+    if pairs is None:
+        #the boxes on both sides of every edge, border edges point at an extra box that
+        #never has sides drawn
+        first = numpy.array([boxes[0] for boxes in state.edge_boxes], dtype=numpy.intp)
+        second = numpy.array([boxes[-1] if len(boxes) == 2 else state.num_boxes
+                              for boxes in state.edge_boxes], dtype=numpy.intp)
+        pairs = _numpy_pairs[(state.rows, state.columns)] = (first, second)
+    sides = numpy.zeros(state.num_boxes + 1, dtype=numpy.uint8)
+    sides[:-1] = numpy.frombuffer(state.sides, dtype=numpy.uint8)
+    drawn = numpy.frombuffer(state.drawn, dtype=numpy.uint8) != 0
+    counts = numpy.maximum(sides[pairs[0]], sides[pairs[1]])
+    #drawn edges get a count no undrawn edge can have
+    counts[drawn] = 4
+    return tuple(numpy.flatnonzero(counts == level).tolist() for level in range(4))
+
+def rewind(state, depth):
+    #takes back the potential moves played during an analysis
+    while len(state.history) > depth:
+        state.undo()
+
+def capturable(state, analysis):
+    '''The chains and loops that can be taken right now, sorted by their lowest box. They
+        hold a box with three sides drawn, and those boxes are found by searching the side
+        counts as bytes, so the many other chains of a big board are not looked at.
+    '''
+    found = []
+    sides = bytes(state.sides)
+    box = sides.find(3)
+    while box >= 0:
+        component = analysis.component[box]
+        if component not in found:
+            found.append(component)
+        box = sides.find(3, box + 1)
+    found.sort(key=lambda component: min(component.boxes))
+    return found
+
+def take_all(state, boxes, taken=None):
+    '''Plays edges that close boxes, starting from the given boxes, for as long as
+        there is one to take. Returns the number of boxes closed. The closed boxes are
+        added to the set taken when one is given.
+    '''
+    numComplete = 0
+    stack = list(boxes)
+    while stack:
+        box = stack.pop()
+        if state.sides[box] != 3:
+            continue
+        for edge in state.box_edges[box]:
+            if not state.is_drawn(edge):
+                closed = state.play(edge)
+                numComplete += len(closed)
+                if taken is not None:
+                    taken.update(closed)
+                stack.extend(state.edge_boxes[edge])
+                break
+    return numComplete
+
+def double_cross_check(state, edge):
+    '''Checks to see whether a double_cross move is appropriate. This is when there
+        are two boxes remaining in the chain, and the next chain is larger than 2.
+        The boxes that can be taken are played out on the state, since taking them can join
+        the chains around them, and the chain sizes then come from the chain analyzer.
+    '''
+    depth = len(state.history)
+    numComplete = take_all(state, [box for component in capturable(state, chains.analyzer(state))
+                                    for box in component.boxes])
+    #the size of largest remaining chain or loop
+    nextChain = max((len(component) for component in chains.analyzer(state).components), default=0)
+    rewind(state, depth)
+    #We want there to be only two boxes left in the chain and the next chain to be greater than 2
+    return nextChain > 2 and numComplete == 2
+
+def double_cross_play(state, edge_check):
+    '''Finds the edge where the double-cross move should be played, which
+        sacrifices two squares to the opponent. This is the far side of the second box of
+        a chain of two that can be taken. If it is not possible to double-cross
+        then it returns None
+    '''
+    analysis = chains.analyzer(state)
+    for component in capturable(state, analysis):
+        if len(component) != 2:
+            continue
+        first, second = component.boxes
+        if state.sides[second] == 3:
+            first, second = second, first
+        if state.sides[second] != 2:
+            continue
+        for edge in state.box_edges[second]:
+            if not state.is_drawn(edge) and first not in state.edge_boxes[edge]:
+                return edge
+    return None
+
+def forced_move(state, forced_choices):
+    '''loops through the options and selects the one that will give the opponent
+        the least number of complete squares. Each option is played and the boxes it
+        gives away are taken by take_all, which only follows the chain that was opened.
+        The counts are kept from one move to the next (see Sacrifices), and an option next
+        to a chain longer than the fewest boxes found so far is not played out at all.
+    '''
+    counts = sacrifices(state)
+    known = counts.counts
+    missing = [edge for edge in forced_choices if edge not in known]
+    if missing:
+        #drawing an option gives at least the chain or loop next to it away, so an option
+        #is only played out when that is no more than the fewest boxes found so far
+        minComplete = min([known[edge] for edge in forced_choices if edge in known], default=None)
+        analysis = chains.analyzer(state)
+        for least, edge in sorted((least_given(state, analysis, edge), edge) for edge in missing):
+            if minComplete is not None and least > minComplete:
+                break
+            numComplete = counts.count(edge)
+            if minComplete is None or numComplete < minComplete:
+                minComplete = numComplete
+    #the first of the options that give the fewest boxes away, the ones not played out
+    #give more than that
+    return min(forced_choices, key=lambda edge: known.get(edge, state.num_boxes + 1))
+
+def least_given(state, analysis, edge):
+    '''Returns the fewest boxes drawing an edge can give away. A box with two sides drawn
+        next to it gets a third one, so take_all follows the whole chain or loop that the
+        box is in. A box the edge closes itself is not counted as given away.
+    '''
+    least = 0
+    for box in state.edge_boxes[edge]:
+        if state.sides[box] == 3:
+            return 0
+        if state.sides[box] == 2 and len(analysis.component[box]) > least:
+            least = len(analysis.component[box])
+    return least
+
+class Sacrifices:
+    '''Remembers how many boxes forced_move found each edge gives away. The count of an
+        edge only depends on the boxes take_all looked at, so it stays good until a side of
+        one of them is drawn or taken back. Between two moves only the edges near the lines
+        drawn since then are played out again, which matters on big boards where every
+        move gives boxes away for thousands of moves.
+
+        Every edge that opens the same chain looks at the same boxes, so the edges are kept
+        in groups by the boxes they looked at, and a box only points at the groups. A chain
+        of n boxes then takes about n entries instead of n for every edge along it.
+    '''
+
+    def __init__(self, state):
+        self.state = state
+        #the edges drawn and taken back since the counts were worked out
+        self.changes = state.changes()
+        #the number of boxes each edge gives away, by edge
+        self.counts = {}
+        #the numbers of the groups whose counts depend on a box, by box, in a list as a box
+        #is seldom in more than two groups
+        self.watchers = {}
+        #the boxes a group of counts depends on, as a sorted tuple, and its edges, by number
+        self.groups = {}
+        #the number of the group that depends on a tuple of boxes
+        self.numbers = {}
+        self.serial = 0
+
+    def sync(self):
+        #forgets the counts that depend on boxes next to edges that changed
+        for edge in self.changes.take():
+            for box in self.state.edge_boxes[edge]:
+                for number in self.watchers.pop(box, ()):
+                    self.forget(number)
+        return self
+
+    def forget(self, number):
+        #drops the counts of a group and every watcher entry that points at it
+        group = self.groups.pop(number, None)
+        if group is None:
+            return
+        boxes, options = group
+        del self.numbers[boxes]
+        for option in options:
+            del self.counts[option]
+        watchers = self.watchers
+        for box in boxes:
+            found = watchers.get(box)
+            if found is not None:
+                found.remove(number)
+                if not found:
+                    del watchers[box]
+
+    def count(self, edge):
+        #the number of boxes drawing edge gives away
+        found = self.counts.get(edge)
+        if found is None:
+            state = self.state
+            depth = len(state.history)
+            closed = set()
+            state.play(edge)
+            numComplete = take_all(state, state.edge_boxes[edge], closed)
+            rewind(state, depth)
+            found = self.counts[edge] = numComplete
+            #take_all looked at the boxes next to the edge and around the boxes it closed
+            watched = set(state.edge_boxes[edge])
+            for box in closed:
+                for side in state.box_edges[box]:
+                    watched.update(state.edge_boxes[side])
+            boxes = tuple(sorted(watched))
+            number = self.numbers.get(boxes)
+            if number is None:
+                self.serial += 1
+                number = self.numbers[boxes] = self.serial
+                self.groups[number] = (boxes, [edge])
+                for box in boxes:
+                    self.watchers.setdefault(box, []).append(number)
+            else:
+                self.groups[number][1].append(edge)
+        return found
+
+_sacrifices = weakref.WeakKeyDictionary()
+
+def sacrifices(state):
+    #the counts kept for a state, brought up to date with the moves played since
+    found = _sacrifices.get(state)
+    if found is None:
+        found = Sacrifices(weakref.proxy(state))
+        _sacrifices[state] = found
+    return found.sync()
+
+def find_neighbors(state, edge):
+    '''This function gives a list of the edges that are neighbors of another edge, meaning
+        that if they are drawn a square is completed. The middle edges have two sets of
+        neighbors. Each set holds whether the neighbor edges are drawn.
+    '''
+    return [[state.is_drawn(other) for other in siblings] for siblings in state.edge_siblings[edge]]
+
+def complete_square(state, edge):
+    '''This function returns whether a move will complete a square. The state keeps the number
+        of drawn sides of every box, so this only looks at the boxes next to the edge.
+    '''
+    drawn = state.drawn[edge]
+    sides = state.sides
+    for box in state.edge_boxes[edge]:
+        if sides[box] - drawn == 3:
+            return True
+    return False
+
+def neighbor_count(state, edge):
+    '''Returns the number of neighbor edges of an edge that are drawn. If the edge has two
+        sets of neighbors (it is not an edge on the border), then it returns the higher
+        number of the two sets.
+    '''
+    sides = state.sides
+    boxes = state.edge_boxes[edge]
+    count = sides[boxes[0]]
+    if len(boxes) == 2 and sides[boxes[1]] > count:
+        count = sides[boxes[1]]
+    return count - state.drawn[edge]
+
+
+def testModule(): #checks the kept Sacrifices counts, and that the numpy and the plain Python classify_moves give the same lists
+    from state import GameState
+
+    #every watcher entry belongs to a count that is still kept, and the other way around
+    state = GameState(12, 12)
+    rng = random.Random(0)
+    kept = 0
+    while not state.game_over():
+        state.play(find_move(state, rng))
+        counts = sacrifices(state)
+        entries = [(box, number) for box, numbers in counts.watchers.items() for number in numbers]
+        assert sorted(entries) == sorted((box, number) for number, (boxes, options) in counts.groups.items()
+                                         for box in boxes)
+        options = [option for boxes, options in counts.groups.values() for option in options]
+        assert sorted(options) == sorted(counts.counts)
+        assert len(counts.numbers) == len(counts.groups)
+        kept = max(kept, len(entries))
+    print('Sacrifices kept at most %d watcher entries in a 12x12 game' % kept)
+
+    if numpy is None:
+        print('numpy is not installed, only the plain Python classify_moves can run')
+        return
+    rng = random.Random(0)
+    checked = 0
+    for rows, columns in [(6, 6), (12, 25), (60, 60)]:
+        for game in range(20):
+            state = GameState(rows, columns)
+            moves = state.legal_moves()
+            rng.shuffle(moves)
+            #from an empty board to a full one, so every count of sides turns up
+            for edge in moves[:rng.randint(0, len(moves))]:
+                state.play(edge)
+            assert classify_moves_numpy(state) == classify_moves_python(state), (rows, columns, state.moves())
+            checked += 1
+    print('%d positions checked' % checked)
+
+if __name__ == '__main__':
+    testModule()
@@ -0,0 +1,392 @@
+'''
+    bench.py
+    Benchmarks for the AI that run without a window.
+    Run it with: python bench.py
+
+    On every board size in SIZES it times the heuristic player's find_move, the
+    complete_square and neighbor_count checks, forced_move and take_all on the same seeded
+    positions every run, and plays whole games to count games per second. Times are given
+    as the middle (p50) and the 99th percentile (p99) of the samples.
+
+    The results can be saved and a later run compared against them, which lists every
+    time that got slower than the tolerance allows and exits with status 1 if there is one:
+        python bench.py --save baseline.json
+        python bench.py --baseline baseline.json
+    The older before and after comparisons are run with --micro.
+
+    --large times a whole game of the heuristic player against itself on one big board and
+    gives the memory the game state takes per box, and the most memory per box in use at
+    any point of the game with everything the player keeps, e.g.
+        python bench.py --large 100x100
+'''
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+import ai
+from state import GameState
+from tournament import parse_sizes, percentile
+
+
+SIZES = [(2, 2), (6, 6), (12, 25)]
+#how many seeded positions are timed and how many games are played on each size
+POSITIONS = {(2, 2): 100, (6, 6): 50, (12, 25): 10}
+GAMES = {(2, 2): 200, (6, 6): 20, (12, 25): 2}
+
+
+def random_position(rows, columns, moves, seed):
+    #plays random edges that do not give a box away, so it looks like a middle game position
+    rng = random.Random(seed)
+    state = GameState(rows, columns)
+    for edge in rng.sample(range(state.num_edges), state.num_edges):
+        if moves == 0:
+            break
+        if ai.neighbor_count(state, edge) < 2:
+            state.play(edge)
+            moves -= 1
+    return state
+
+
+def state_moves(rows, columns):
+    #about a third of the edges are drawn in the benchmark positions
+    return (rows * (2 * columns + 1) + columns) // 3
+
+
+class LayoutBoard:
+    '''The layout of drawn flags the first Board kept, draw_values and alt_values with a
+        value for every dot, line and box, filled in from a state. It only holds what the
+        original find_neighbors looked at, so that can be timed without a window.
+    '''
+
+    def __init__(self, state):
+        #rows and columns are the doubled layout values, as they were in Board
+        self.rows = 2 * state.rows
+        self.columns = 2 * state.columns
+        self.draw_values = []
+        self.alt_values = []
+        for j in range(self.rows + 1):
+            self.draw_values.append([])
+            self.alt_values.append([])
+            for i in range(self.columns + 1):
+                dot = j % 2 == 0 and i % 2 == 0
+                line = (j + i) % 2 == 1
+                self.draw_values[j].append(dot or (line and state.is_drawn(state.edge_index(j, i))))
+                self.alt_values[j].append(dot)
+
+    def find_neighbors(self, window, j, i):
+        #Board.find_neighbors as it was before the neighbor index, unchanged
+        neighbors = []
+        if j == 0:
+            #The line is a horizontal line in the first row
+            neighbors.append([self.draw_values[j+2][i], self.draw_values[j+1][i-1], self.draw_values[j+1][i+1],
+            self.alt_values[j+2][i], self.alt_values[j+1][i-1], self.alt_values[j+1][i+1]])
+        elif j == self.rows:
+            #The line is a horizontal line in the final row
+            neighbors.append([self.draw_values[j-2][i], self.draw_values[j-1][i-1], self.draw_values[j-1][i+1],
+            self.alt_values[j-2][i], self.alt_values[j-1][i-1], self.alt_values[j-1][i+1]])
+        elif j % 2 == 0:
+            #The line is a horizontal line in one of the middle rows
+            neighbors.append([self.draw_values[j-2][i], self.draw_values[j-1][i-1], self.draw_values[j-1][i+1],
+            self.alt_values[j-2][i], self.alt_values[j-1][i-1], self.alt_values[j-1][i+1]])
+            neighbors.append([self.draw_values[j+2][i], self.draw_values[j+1][i-1], self.draw_values[j+1][i+1],
+            self.alt_values[j+2][i], self.alt_values[j+1][i-1], self.alt_values[j+1][i+1]])
+        elif i == 0:
+            #The line is a vertical line in the first column
+            neighbors.append([self.draw_values[j][i+2], self.draw_values[j+1][i+1], self.draw_values[j-1][i+1],
+            self.alt_values[j][i+2], self.alt_values[j+1][i+1], self.alt_values[j-1][i+1]])
+        elif i == self.columns:
+            #The line is a vertical line in the final column
+            neighbors.append([self.draw_values[j][i-2], self.draw_values[j+1][i-1], self.draw_values[j-1][i-1],
+            self.alt_values[j][i-2], self.alt_values[j+1][i-1], self.alt_values[j-1][i-1]])
+        elif i % 2 == 0:
+            #The line is a vertical line in one of the middle columns
+            neighbors.append([self.draw_values[j][i-2], self.draw_values[j-1][i-1], self.draw_values[j+1][i-1],
+            self.alt_values[j][i-2], self.alt_values[j-1][i-1], self.alt_values[j+1][i-1]])
+            neighbors.append([self.draw_values[j][i+2], self.draw_values[j-1][i+1], self.draw_values[j+1][i+1],
+            self.alt_values[j][i+2], self.alt_values[j-1][i+1], self.alt_values[j+1][i+1]])
+        return neighbors
+
+
+def board_neighbor_count(gameboard, win, j, i):
+    #neighbor_count of game1.py as it was before the neighbor index, unchanged
+    counts = []
+    neighbors = gameboard.find_neighbors(win, j, i)
+    for neighbor in neighbors:
+        count = 0
+        for value in neighbor:
+            if value == True:
+                count += 1
+        counts.append(count)
+    return max(counts)
+
+
+def bench_neighbors(rows=6, columns=6, number=20):
+    '''Times one neighbor_count call for every undrawn edge of a middle game position.
+        Before is the original code, the if/elif chain of Board.find_neighbors building new
+        lists on the layout of the first Board, with the neighbor_count of game1.py. After
+        is neighbor_count of ai.py with the neighbor index. Returns the cost of a single
+        call in microseconds for both.
+    '''
+    state = random_position(rows, columns, state_moves(rows, columns), 1)
+    edges = state.legal_moves()
+    calls = number * len(edges)
+    board = LayoutBoard(state)
+    coords = [state.edge_coords(edge) for edge in edges]
+    #the original counted the alt_values too, which are all False between AI moves
+    assert [board_neighbor_count(board, None, j, i) for j, i in coords] == \
+        [ai.neighbor_count(state, edge) for edge in edges]
+    before = timeit.timeit(lambda: [board_neighbor_count(board, None, j, i) for j, i in coords], number=number)
+    after = timeit.timeit(lambda: [ai.neighbor_count(state, edge) for edge in edges], number=number)
+    return before / calls * 1e6, after / calls * 1e6
+
+
+def loop_classify(state):
+    #sorts the moves one edge at a time with complete_square and neighbor_count
+    levels = ([], [], [], [])
+    for edge in range(state.num_edges):
+        if not state.is_drawn(edge):
+            if ai.complete_square(state, edge):
+                levels[3].append(edge)
+            else:
+                levels[ai.neighbor_count(state, edge)].append(edge)
+    return levels
+
+
+def bench_classify(rows, columns, number=20):
+    '''Times sorting all the moves of a middle game position, one edge at a time, with
+        classify_moves in plain Python and with classify_moves using numpy (None when numpy
+        is not installed). Returns the time of one call in microseconds for each.
+    '''
+    state = random_position(rows, columns, state_moves(rows, columns), 1)
+    loop = timeit.timeit(lambda: loop_classify(state), number=number) / number * 1e6
+    saved = ai.numpy
+    ai.numpy = None
+    python = timeit.timeit(lambda: ai.classify_moves(state), number=number) / number * 1e6
+    ai.numpy = saved
+    vectorized = None
+    if ai.numpy is not None:
+        vectorized = timeit.timeit(lambda: ai.classify_moves_numpy(state), number=number) / number * 1e6
+    return loop, python, vectorized
+
+
+def per_call(function, items, repeat=5):
+    '''Returns the time of one call in seconds. The calls for all the items are timed
+        together, so the clock is not read around every tiny call, and the quickest of
+        repeat rounds is kept.
+    '''
+    best = None
+    for round in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        spent = time.perf_counter() - start
+        if best is None or spent < best:
+            best = spent
+    return best / len(items)
+
+
+def timed(function):
+    #the time of a single call in seconds
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def bench_size(rows, columns):
+    '''Times the AI on the seeded positions of one board size. Returns p50 and p99 in
+        microseconds for every timed function and the number of games played a second.
+    '''
+    samples = {name: [] for name in ('find_move', 'find_move_endgame', 'complete_square',
+                                     'neighbor_count', 'forced_move', 'take_all')}
+    for seed in range(POSITIONS.get((rows, columns), 20)):
+        middle = random_position(rows, columns, state_moves(rows, columns), seed)
+        edges = middle.legal_moves()
+        samples['complete_square'].append(per_call(lambda edge: ai.complete_square(middle, edge), edges))
+        samples['neighbor_count'].append(per_call(lambda edge: ai.neighbor_count(middle, edge), edges))
+        samples['find_move'].append(timed(lambda: ai.find_move(middle, seed)))
+
+        #every edge that is left gives boxes away
+        end = random_position(rows, columns, middle.num_edges, seed)
+        choices = ai.classify_moves(end)[2]
+        samples['forced_move'].append(timed(lambda: ai.forced_move(end, choices)))
+        samples['find_move_endgame'].append(timed(lambda: ai.find_move(end, seed)))
+        depth = len(end.history)
+        end.play(choices[0])
+        samples['take_all'].append(timed(lambda: ai.take_all(end, end.edge_boxes[choices[0]])))
+        ai.rewind(end, depth)
+
+    found = {}
+    for name, times in samples.items():
+        times.sort()
+        found[name] = {'p50': percentile(times, 50) * 1e6, 'p99': percentile(times, 99) * 1e6}
+
+    games = GAMES.get((rows, columns), 5)
+    start = time.perf_counter()
+    for seed in range(games):
+        rng = random.Random(seed)
+        state = GameState(rows, columns)
+        while not state.game_over():
+            state.play(ai.find_move(state, rng))
+    found['games_per_second'] = games / (time.perf_counter() - start)
+    return found
+
+
+def run_suite(sizes=SIZES):
+    results = {'python': platform.python_version(), 'numpy': ai.numpy is not None, 'sizes': {}}
+    for rows, columns in sizes:
+        results['sizes']['%dx%d' % (rows, columns)] = bench_size(rows, columns)
+    return results
+
+
+def print_results(results):
+    for size, found in results['sizes'].items():
+        print('%s: %.1f games/sec' % (size, found['games_per_second']))
+        for name, times in found.items():
+            if name != 'games_per_second':
+                print('    %-18s p50 %10.2f us   p99 %10.2f us' % (name, times['p50'], times['p99']))
+
+
+def compare(results, baseline, tolerance=1.25):
+    '''Returns a line for every p50 time that is more than tolerance times the baseline and
+        every games per second that is less than the baseline divided by tolerance. The p99
+        times change too much from run to run to be compared.
+    '''
+    slower = []
+    for size, found in results['sizes'].items():
+        old = baseline['sizes'].get(size)
+        if old is None:
+            continue
+        for name, times in found.items():
+            if name not in old:
+                continue
+            if name == 'games_per_second':
+                if times * tolerance < old[name]:
+                    slower.append('%s games/sec: %.1f, was %.1f' % (size, times, old[name]))
+            elif times['p50'] > old[name]['p50'] * tolerance:
+                slower.append('%s %s p50: %.2f us, was %.2f us' % (size, name, times['p50'], old[name]['p50']))
+    return slower
+
+
+def state_memory(rows, columns):
+    '''Returns the bytes a game state of the board takes per box, with its tables and the
+        history of a whole game, as counted by tracemalloc.
+    '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        state = GameState(rows, columns)
+        moves = list(range(state.num_edges))
+        random.Random(0).shuffle(moves)
+        del moves[state.num_edges // 2:]
+        for edge in moves:
+            state.play(edge)
+        #the list of moves is not part of the state
+        used = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(moves)
+    finally:
+        tracemalloc.stop()
+    return used / state.num_boxes
+
+
+def game_memory(rows, columns, seed=0):
+    '''Returns the most bytes per box that were in use at any time while the heuristic
+        player played a whole game against itself, as counted by tracemalloc. Unlike
+        state_memory this takes in everything the player keeps between moves, like the
+        chain analyzer and the Sacrifices counts.
+    '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        rng = random.Random(seed)
+        state = GameState(rows, columns)
+        while not state.game_over():
+            state.play(ai.find_move(state, rng))
+        used = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return used / state.num_boxes
+
+
+def bench_large(rows, columns, seed=0, memory=True):
+    '''Plays one game of the heuristic player against itself on a board of any size and
+        returns the time per move, the time of the whole game and the memory per box, both
+        of the game state alone and at the peak of a whole game. The peak is found by
+        playing the game again with tracemalloc on, which is slow, so memory=False leaves
+        it out.
+    '''
+    bytes_per_box = state_memory(rows, columns)
+    rng = random.Random(seed)
+    state = GameState(rows, columns)
+    times = []
+    start = time.perf_counter()
+    while not state.game_over():
+        moved = time.perf_counter()
+        state.play(ai.find_move(state, rng))
+        times.append((time.perf_counter() - moved) * 1e6)
+    times.sort()
+    return {'moves': len(times), 'seconds': time.perf_counter() - start, 'score': state.score,
+            'p50': percentile(times, 50), 'p99': percentile(times, 99), 'max': times[-1],
+            'bytes_per_box': bytes_per_box,
+            'peak_bytes_per_box': game_memory(rows, columns, seed) if memory else None}
+
+
+def micro():
+    for rows, columns in [(2, 2), (6, 6), (12, 25)]:
+        before, after = bench_neighbors(rows, columns)
+        print("neighbor_count %dx%d: %.2f us per call before, %.2f us after" % (rows, columns, before, after))
+    for rows, columns in [(6, 6), (12, 25), (50, 50)]:
+        loop, python, vectorized = bench_classify(rows, columns)
+        line = "classify_moves %dx%d: %.0f us one edge at a time, %.0f us in Python" % (rows, columns, loop, python)
+        if vectorized is not None:
+            line += ", %.0f us with numpy" % vectorized
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the computer player without a window.')
+    parser.add_argument('--save', default=None, help='file to save the results to, as a baseline for later runs')
+    parser.add_argument('--baseline', default=None, help='results saved earlier to compare this run against')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='how many times slower than the baseline counts as slower')
+    parser.add_argument('--micro', action='store_true', help='run the older before and after comparisons')
+    parser.add_argument('--large', type=parse_sizes, default=None,
+                        help='board sizes to play one whole game on, like 100x100')
+    parser.add_argument('--no-peak', action='store_true',
+                        help='with --large, do not play the game again to find its peak memory')
+    args = parser.parse_args()
+    if args.micro:
+        micro()
+        return
+    if args.large:
+        for rows, columns in args.large:
+            found = bench_large(rows, columns, memory=not args.no_peak)
+            line = ('%dx%d: %d moves in %.1f s, per move p50 %.0f us p99 %.0f us max %.0f us, '
+                    'state %.1f bytes a box' % (rows, columns, found['moves'], found['seconds'],
+                    found['p50'], found['p99'], found['max'], found['bytes_per_box']))
+            if found['peak_bytes_per_box'] is not None:
+                line += ', game peak %.1f bytes a box' % found['peak_bytes_per_box']
+            print(line + ', score %d-%d' % tuple(found['score']))
+        return
+
+    results = run_suite()
+    print_results(results)
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump(results, out, indent=2)
+    if args.baseline:
+        with open(args.baseline) as saved:
+            slower = compare(results, json.load(saved), args.tolerance)
+        for line in slower:
+            print('slower: ' + line)
+        if slower:
+            sys.exit(1)
+        print('no slower than the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@ horizontal line):
 
 
 from graphics import *
+from state import GameState
 
 
 class Board(GraphWin):
@@ -30,9 +31,9 @@ class Board(GraphWin):
         self.winHeight = winHeight
         self.winWidth = winWidth
         self.board = []
+        #the headless game state that the AI works on, created in build_board
+        self.state = None
         self.draw_values = []
-        #used to analyize potential moves
-        self.alt_values = []
 
         #for the dots the radius is always 4
         self.radius = 4
@@ -52,38 +53,98 @@ class Board(GraphWin):
         self.move = 0
         self.square_found = False
         self.click_completed = False
+        #the boxes closed by the last line that was drawn, filled in by check_square
+        self.closed = ()
+        #the rectangle around every line that a click has to fall in, as (left, right, top, bottom)
+        #by edge number, and the position of the first dot, all set in build_board
+        self.hitboxes = []
+        self.left = 0
+        self.top = 0
+        #graphics items that changed since the window was last updated, drawn by flush
+        self.pending = []
+        #the edges of the lines taken back by undo, the last one is put back first by redo
+        self.redone = []
 
 
     #draws the actual lines
     def draw(self, window, row_value, column_value):
         #This checks if the input is drawn yet and draws it if it is not
         if self.draw_values[row_value][column_value] == False:
-            self.board[row_value][column_value].draw(window)
+            self.pending.append(self.board[row_value][column_value])
             self.draw_values[row_value][column_value] = True
+            #lines are also played on the game state, squares are filled in by check_square
+            if (row_value + column_value) % 2 != 0:
+                edge = self.state.edge_index(row_value, column_value)
+                self.closed = self.state.play(edge)
+                #a line that was not the next one to redo starts a new line of play
+                if self.redone and self.redone[-1] == edge:
+                    self.redone.pop()
+                else:
+                    self.redone = []
 
-    #invisible lines for the computer AI to use
-    def alt_draw(self, window, row_value, column_value):
-        #This checks if the input is drawn yet and draws it if it is not
-        if self.draw_values[row_value][column_value] == False and self.alt_values[row_value][column_value] == False:
-            self.alt_values[row_value][column_value] = True
+    def undo(self, window):
+        '''Takes back the last line, along with the squares it filled in, and gives the
+            turn back to the player who drew it. The game state keeps every move, so this
+            only touches that line and its squares. Returns the player who drew the line
+            (0 for the human, 1 for the computer), or None when no line is drawn.
+        '''
+        last = self.state.last_move()
+        if last is None:
+            return None
+        edge, player, closed = last
+        self.state.undo()
+        self.redone.append(edge)
+        j, i = self.state.edge_coords(edge)
+        self.erase(j, i)
+        for box in closed:
+            j, i = self.state.box_coords(box)
+            self.erase(j, i)
+            if player == 0:
+                self.square_count1 -= 1
+            else:
+                self.square_count2 -= 1
+        self.move = player
+        self.closed = ()
+        self.square_found = False
+        self.game_complete = False
+        self.flush(window)
+        return player
 
-    def clear_alts(self, window):
-        for j in range(self.rows + 1):
-            for i in range(self.columns + 1):
-                if self.alt_values[j][i]:
-                    self.alt_values[j][i] = False
+    def redo(self, window):
+        '''Draws the last line that was taken back again and fills in its squares. Returns
+            False when there is nothing to redo.
+        '''
+        if not self.redone:
+            return False
+        j, i = self.state.edge_coords(self.redone[-1])
+        self.draw(window, j, i)
+        self.check_square(window, 'red' if self.move == 0 else 'blue')
+        return True
+
+    def erase(self, row_value, column_value):
+        #takes a line or square off the window again
+        item = self.board[row_value][column_value]
+        if item in self.pending:
+            self.pending.remove(item)
+        else:
+            item.undraw()
+        self.draw_values[row_value][column_value] = False
 
 
     def build_board(self, window):
         '''This function creates a board list which contains lists of each of the elements in
             a row. It also creates a draw_values list that contains a boolean corresponding to
             each graphical element. False if it is not drawn yet and True if it has been drawn.
-            All the dots are drawn immediately.
+            All the dots are drawn at once with a single window update at the end. The
+            headless game state is created here too.
         '''
+        self.state = GameState(self.rows // 2, self.columns // 2)
+        self.hitboxes = [None] * self.state.num_edges
+        self.left = self.winWidth / 4.5
+        self.top = self.winHeight / 4.5
         for row in range(self.rows + 1):
             self.board.append([])
             self.draw_values.append([])
-            self.alt_values.append([])
 
         self.win = window
 
@@ -95,27 +156,28 @@ class Board(GraphWin):
                 #Tests whether it is a dot
                 if x % 2 == 0 and y % 2 == 0:
                     dot = Circle(Point(px, py), self.radius)
-                    dot.draw(window)
                     dot.setFill(self.pcolor)
+                    self.pending.append(dot)
                     self.board[y].append(dot)
                     self.draw_values[y].append(True)
-                    self.alt_values[y].append(True)
 
                 #Tests whether it is a horizontal line
                 elif  x % 2 != 0 and  y % 2 == 0:
                     self.hline = Line(Point(px - self.linelength/2, py), Point(px + self.linelength/2, py))
                     self.hline.setWidth(3)
+                    self.hitboxes[self.state.edge_index(y, x)] = (px - self.linelength / 3, px + self.linelength / 3,
+                                                                  py - self.linelength / 5, py + self.linelength / 5)
                     self.board[y].append(self.hline)
                     self.draw_values[y].append(False)
-                    self.alt_values[y].append(False)
 
                #Tests whether it is a vertical line
                 elif  x % 2 == 0 and  y % 2 != 0:
                     self.vline = Line(Point(px, py - self.linelength/2), Point(px, py + self.linelength/2))
                     self.vline.setWidth(3)
+                    self.hitboxes[self.state.edge_index(y, x)] = (px - self.linelength / 5, px + self.linelength / 5,
+                                                                  py - self.linelength / 3, py + self.linelength / 3)
                     self.board[y].append(self.vline)
                     self.draw_values[y].append(False)
-                    self.alt_values[y].append(False)
 
                 #It must be a square
                 else:
@@ -125,67 +187,80 @@ class Board(GraphWin):
                                             Point(px - round(self.linelength/2 -2), py + round(self.linelength/2 -2)))
                     self.board[y].append(self.square)
                     self.draw_values[y].append(False)
-                    self.alt_values[y].append(False)
+        self.flush(window)
+
+    def flush(self, window):
+        '''Draws every item that changed since the last flush and then updates the window
+            once. With autoflush on, graphics.py updates the window after every single item,
+            so it is turned off while the items are drawn.
+        '''
+        autoflush = window.autoflush
+        window.autoflush = False
+        for item in self.pending:
+            item.draw(window)
+        window.autoflush = autoflush
+        self.pending = []
+        window.flush()
 
     def click(self,window):
-        '''This function registers a mouse click and loops through the board list. For every
-            line it checks whether the clicks coordinants are within a rectangle drawn at the line.
-            If they are then draw() is called on the line. If the click's coordinants do not coorespond
-            to any line the player gets to go again.
+        '''This function registers a mouse click and draws the line that was clicked on.
+            If the click's coordinants do not coorespond to any line the player gets to go again.
         '''
-        while True:
-            clickPoint = window.getMouse()
-            self.xclick = clickPoint.getX()
-            self.yclick = clickPoint.getY()
-            for j in range(len(self.board)):
-                row = self.board[j]
-                for i in range(len(row)):
-                    if i % 2 != 0 and j % 2 == 0:
-                        #it is a horizontal line
-                        #It checks whether the click point is within a square drawn around the line
-                        #board[j][i].getCenter().getX() returns the x coordinate of the center of the  dot
-                        if (self.board[j][i].getCenter().getX() - self.linelength / 3
-                        <= self.xclick <= self.board[j][i].getCenter().getX() + self.linelength / 3
-                        and self.board[j][i].getCenter().getY() - self.linelength / 5
-                        <= self.yclick <= self.board[j][i].getCenter().getY() + self.linelength / 5
-                        and not self.draw_values[j][i]):
-                            self.draw(window, j, i)
-                            return
-                    elif i % 2 == 0 and j % 2 != 0:
-                        #it is a vertical line
-                        #It checks whether the click point is within a square drawn around the line
-                        if (self.board[j][i].getCenter().getX() - self.linelength / 5
-                        <= self.xclick <= self.board[j][i].getCenter().getX() + self.linelength / 5
-                        and self.board[j][i].getCenter().getY() - self.linelength / 3
-                        <= self.yclick <= self.board[j][i].getCenter().getY() + self.linelength / 3
-                        and not self.draw_values[j][i]):
-                            self.draw(window, j, i)
-                            return
+        while not self.click_at(window, window.getMouse()):
+            pass
+
+    def click_at(self, window, clickPoint):
+        '''Draws the line at a point that was clicked on, for a game loop that checks for
+            clicks without waiting. Returns True if a line was drawn.
+        '''
+        self.xclick = clickPoint.getX()
+        self.yclick = clickPoint.getY()
+        line = self.find_line(self.xclick, self.yclick)
+        if line is None:
+            return False
+        self.draw(window, line[0], line[1])
+        return True
+
+    def find_line(self, x, y):
+        '''Returns the [j][i] position of the undrawn line whose rectangle holds the point, or
+            None. The rectangles reach less than one grid step from the middle of their line, so
+            only the lines at the four grid positions around the point have to be checked.
+        '''
+        step = self.linelength / 2
+        gx = (x - self.left) / step
+        gy = (y - self.top) / step
+        j0 = int(gy // 1)
+        i0 = int(gx // 1)
+        for j in (j0, j0 + 1):
+            for i in (i0, i0 + 1):
+                #it has to be a line on the board that is not drawn yet
+                if not (0 <= j <= self.rows and 0 <= i <= self.columns) or (i + j) % 2 == 0:
+                    continue
+                if self.draw_values[j][i]:
+                    continue
+                left, right, top, bottom = self.hitboxes[self.state.edge_index(j, i)]
+                if left <= x <= right and top <= y <= bottom:
+                    return j, i
+        return None
 
     def check_square(self, window, color):
-        '''This function loops through each of the elements in the board list and checks
-            if it is a square. If it is it checks if all 4 of its neighbor lines have been
-            drawn. If they have it fills in the square.
+        '''This function fills in the squares closed by the last line that was drawn.
+            The game state counts the drawn sides of every square as lines are played,
+            so only the at most two squares next to that line have to be looked at.
+            This ends a move, so everything drawn during it is put on the window here.
         '''
-        for j in range(len(self.board)):
-            row = self.board[j]
-            for i in range(len(row)):
-                #Checks if it is a square
-                if (i % 2) != 0 and (j % 2) != 0:
-                    #Checks if it already was drawn
-                    if self.draw_values[j][i] == False:
-                        #Checks if the surrounding lines have been drawn
-                        if ((self.draw_values[j - 1][i] == True) and (self.draw_values[j][i-1] == True)
-                            and (self.draw_values[j +1][i] == True) and (self.draw_values[j][i+1] == True)):
-                            self.board[j][i].setFill(color)
-                            self.board[j][i].setOutline(color)
-                            self.draw(window, j, i)
-                            self.square_found = True
-                            #checks which player filled in the square(0 or 2 for human, 1 for computer)
-                            if self.move == 0:
-                                self.square_count1 += 1
-                            else:
-                                self.square_count2 += 1
+        for box in self.closed:
+            j, i = self.state.box_coords(box)
+            self.board[j][i].setFill(color)
+            self.board[j][i].setOutline(color)
+            self.draw(window, j, i)
+            self.square_found = True
+            #checks which player filled in the square(0 or 2 for human, 1 for computer)
+            if self.move == 0:
+                self.square_count1 += 1
+            else:
+                self.square_count2 += 1
+        self.closed = ()
 
         #This part tests if a square was completed and if it was the player gets another turn
         if self.square_found == False:
@@ -195,57 +270,26 @@ class Board(GraphWin):
                 self.move = 0
         else:
             self.square_found = False
+        self.flush(window)
 
 
 
     def find_neighbors(self, window, j, i):
         '''This function gives a list of the lines that are neigbors of another line, meaning
             that if they are drawn a square is completed. The middle lines have two sets of
-            neighbors. The list first has the actual draw values and then alternative values
-            to use when the AI is checking potential outcomes
+            neighbors. Each set holds the draw values of its lines, which come from the index
+            built with the game state in build_board.
         '''
         neighbors = []
-        if j == 0:
-            #The line is a horizontal line in the first row
-            neighbors.append([self.draw_values[j+2][i], self.draw_values[j+1][i-1], self.draw_values[j+1][i+1],
-            self.alt_values[j+2][i], self.alt_values[j+1][i-1], self.alt_values[j+1][i+1]])
-        elif j == self.rows:
-            #The line is a horizontal line in the final row
-            neighbors.append([self.draw_values[j-2][i], self.draw_values[j-1][i-1], self.draw_values[j-1][i+1],
-            self.alt_values[j-2][i], self.alt_values[j-1][i-1], self.alt_values[j-1][i+1]])
-        elif j % 2 == 0:
-            #The line is a horizontal line in one of the middle rows
-            neighbors.append([self.draw_values[j-2][i], self.draw_values[j-1][i-1], self.draw_values[j-1][i+1],
-            self.alt_values[j-2][i], self.alt_values[j-1][i-1], self.alt_values[j-1][i+1]])
-            neighbors.append([self.draw_values[j+2][i], self.draw_values[j+1][i-1], self.draw_values[j+1][i+1],
-            self.alt_values[j+2][i], self.alt_values[j+1][i-1], self.alt_values[j+1][i+1]])
-        elif i == 0:
-            #The line is a vertical line in the first column
-            neighbors.append([self.draw_values[j][i+2], self.draw_values[j+1][i+1], self.draw_values[j-1][i+1],
-            self.alt_values[j][i+2], self.alt_values[j+1][i+1], self.alt_values[j-1][i+1]])
-        elif i == self.columns:
-            #The line is a vertical line in the final column
-            neighbors.append([self.draw_values[j][i-2], self.draw_values[j+1][i-1], self.draw_values[j-1][i-1],
-            self.alt_values[j][i-2], self.alt_values[j+1][i-1], self.alt_values[j-1][i-1]])
-        elif i % 2 == 0:
-            #The line is a vertical line in one of the middle columns
-            neighbors.append([self.draw_values[j][i-2], self.draw_values[j-1][i-1], self.draw_values[j+1][i-1],
-            self.alt_values[j][i-2], self.alt_values[j-1][i-1], self.alt_values[j+1][i-1]])
-            neighbors.append([self.draw_values[j][i+2], self.draw_values[j-1][i+1], self.draw_values[j+1][i+1],
-            self.alt_values[j][i+2], self.alt_values[j-1][i+1], self.alt_values[j+1][i+1]])
+        for siblings in self.state.edge_siblings[self.state.edge_index(j, i)]:
+            neighbors.append([self.draw_values[y][x] for y, x in
+                              (self.state.edge_coords(other) for other in siblings)])
         return neighbors
 
 
     def game_finished(self):
         #checks if all squares have been filled in
-        self.game_complete = True
-        for j in range(len(self.board)):
-            row = self.board[j]
-            for i in range(len(row)):
-                #Checks if it is a square
-                if (i % 2) != 0 and (j % 2) != 0:
-                    if self.draw_values[j][i] == False:
-                        self.game_complete = False
+        self.game_complete = self.state.remaining == 0
 
 
 
@@ -254,7 +298,7 @@ def testModule(): #A test module to test one object of the board class
 
     winHeight = 500
     winWidth = 500
-    win = GraphWin('Board Module Test', winWidth, winHeight)
+    win = GraphWin('Board Module Test', winWidth, winHeight, autoflush=False)
     win.setBackground("white")
 
     # make a board and draw it in the window
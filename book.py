@@ -0,0 +1,302 @@
+'''
+    book.py
+    Solved positions for small boards, so the computer can move at once instead of working
+    out the same positions again in every game. The book of a board size is made offline
+    by solving every position up to a number of moves into the game exactly, and it is
+    kept in a file next to this one, like book3x3.bin:
+        python book.py 2x2
+        python book.py 3x3 --plies 6
+
+    Positions are kept by their canonical key (see symmetry.py), so mirror images and turns
+    of a position share one entry, with the best move for the canonical position and the
+    value of the position (the boxes still to be won by the player to move minus the boxes
+    the other player will win). Entries are sorted by key and all the same size, so a
+    lookup is a binary search in the memory mapped file, which is only opened the first
+    time a board of that size asks for a move.
+
+    The solver is an alpha-beta search without a depth limit. It takes a box without
+    looking at other moves when the box's missing side does not lead on to a box with two
+    sides drawn, as no other move can do better then, and it plays positions that are only
+    chains and loops out with endgame.py instead of searching them.
+'''
+import argparse
+import mmap
+import os
+import struct
+import time
+
+import ai
+import chains
+import endgame
+from state import GameState
+
+
+MAGIC = b'DBB1'
+#the magic and the board size
+HEADER = struct.Struct('<4sHH')
+#the canonical key, the canonical best move and the value
+ENTRY = struct.Struct('<QHb')
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class Solver:
+    '''Works out exact values of positions. Searched positions are kept for good, so
+        solving many positions of the same board gets quicker as it goes.
+    '''
+
+    def __init__(self):
+        self.table = {}
+        #values of chain and loop lengths for endgame.value
+        self.memo = {}
+        #the number of positions visited so far
+        self.nodes = 0
+
+    def solve(self, state):
+        #returns the exact value of the state and a best move for the player to move
+        state = state.copy()
+        alpha = -state.num_boxes - 1
+        beta = state.num_boxes + 1
+        best = None
+        for move in self.moves(state):
+            value = self.child(state, move, alpha, beta)
+            if value > alpha:
+                alpha = value
+                best = move
+        return alpha, best
+
+    def values(self, state):
+        #the exact value of every undrawn edge of the state, as (move, value)
+        state = state.copy()
+        alpha = -state.num_boxes - 1
+        beta = state.num_boxes + 1
+        return [(move, self.child(state, move, alpha, beta)) for move in state.legal_moves()]
+
+    def child(self, state, move, alpha, beta):
+        closed = len(state.play(move))
+        if closed:
+            value = closed + self.negamax(state, alpha - closed, beta - closed)
+        else:
+            value = -self.negamax(state, -beta, -alpha)
+        state.undo()
+        return value
+
+    def negamax(self, state, alpha, beta):
+        self.nodes += 1
+        if state.remaining == 0:
+            return 0
+        key, k = state.canonical()
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            value, flag, move = entry
+            if (flag == EXACT or flag == LOWER and value >= beta or
+                    flag == UPPER and value <= alpha):
+                return value
+            hint = state.inverses[k][move]
+        elif endgame.is_simple(state):
+            if 3 in state.sides:
+                value = play_out(state)
+            else:
+                value = endgame.value(*endgame.lengths(chains.analyzer(state)), memo=self.memo)
+            self.table[key] = (value, EXACT, None)
+            return value
+        start = alpha
+        best = -state.num_boxes - 1
+        best_move = None
+        moves = self.moves(state)
+        if hint is not None and hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        for move in moves:
+            value = self.child(state, move, alpha, beta)
+            if value > best:
+                best = value
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+        if best <= start:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (best, flag, state.permutations[k][best_move])
+        return best
+
+    def moves(self, state):
+        '''Returns only the capture when a box can be taken and its missing side is on the
+            edge of the board or leads to a box that does not have two sides drawn. Such a
+            box can not be used to hand boxes back, so taking it first is never worse.
+            Otherwise all the moves, in the order the alpha-beta player tries them.
+        '''
+        for box in range(state.num_boxes):
+            if state.sides[box] == 3:
+                edge = endgame.closing_edge(state, box)
+                others = [other for other in state.edge_boxes[edge] if other != box]
+                if not others or state.sides[others[0]] != 2:
+                    return [edge]
+        noNeighbors, oneNeighbors, twoNeighbors, captures = ai.classify_moves(state)
+        return captures + noNeighbors + oneNeighbors + twoNeighbors
+
+
+def play_out(state):
+    #the value of a position of only chains and loops, found by playing it out exactly
+    depth = len(state.history)
+    player = state.player
+    start = list(state.score)
+    while not state.game_over():
+        state.play(endgame.find_move(state))
+    value = (state.score[player] - start[player]) - (state.score[1 - player] - start[1 - player])
+    ai.rewind(state, depth)
+    return value
+
+
+def positions(rows, columns, plies):
+    '''Yields one state for every canonical position that can be reached with up to the
+        given number of moves, leaving out positions endgame.py already plays exactly.
+    '''
+    level = {GameState(rows, columns).canonical()[0]: []}
+    for ply in range(plies + 1):
+        following = {}
+        for moves in level.values():
+            state = GameState.from_moves(rows, columns, moves)
+            if state.game_over() or endgame.is_simple(state):
+                continue
+            yield state
+            if ply == plies:
+                continue
+            for move in state.legal_moves():
+                state.play(move)
+                key = state.canonical()[0]
+                if key not in following:
+                    following[key] = moves + [move]
+                state.undo()
+        level = following
+
+
+def build(rows, columns, plies, report=None):
+    '''Solves the positions of a board up to plies moves into the game and returns the
+        sorted (key, move, value) entries of the book. report, if given, is called with the
+        number of positions solved so far.
+    '''
+    solver = Solver()
+    entries = []
+    for state in positions(rows, columns, plies):
+        value, move = solver.solve(state)
+        key, k = state.canonical()
+        entries.append((key, state.permutations[k][move], value))
+        if report is not None:
+            report(len(entries))
+    entries.sort()
+    return entries
+
+
+def write_book(path, rows, columns, entries):
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, rows, columns))
+        for entry in entries:
+            out.write(ENTRY.pack(*entry))
+
+
+def book_path(rows, columns):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book%dx%d.bin' % (rows, columns))
+
+
+class Book:
+    '''A book file opened for lookups. Nothing is read until a position is looked up, and
+        then only the pages the binary search touches.
+    '''
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, self.columns = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('%s is not a book file' % path)
+        self.size = (len(self.data) - HEADER.size) // ENTRY.size
+
+    def entry(self, index):
+        return ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)
+
+    def lookup(self, state):
+        '''Returns the best move for the state and the value of the position, or None when
+            the position is not in the book.
+        '''
+        key, k = state.canonical()
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.size:
+            return None
+        found, move, value = self.entry(low)
+        if found != key:
+            return None
+        #the move was stored for the canonical position, so it is turned back
+        return state.inverses[k][move], value
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+#the open book of every board size asked for so far, None when there is no book file
+_books = {}
+
+def lookup(state):
+    '''Returns (move, value) from the book of the state's board size, or None when there is
+        no book for that size or the position is not in it.
+    '''
+    size = (state.rows, state.columns)
+    if size not in _books:
+        path = book_path(*size)
+        _books[size] = Book(path) if os.path.exists(path) else None
+    book = _books[size]
+    if book is None:
+        return None
+    return book.lookup(state)
+
+
+def find_move(state):
+    #the book move for the state, or None so that the computer player searches instead
+    found = lookup(state)
+    return None if found is None else found[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve the opening positions of a small board.')
+    parser.add_argument('size', help='the board size in boxes, like 3x3')
+    parser.add_argument('--plies', type=int, default=None,
+                        help='how many moves into the game to solve, the whole game by default')
+    parser.add_argument('--out', default=None, help='the file to write, next to book.py by default')
+    args = parser.parse_args()
+    rows, columns = (int(number) for number in args.size.lower().split('x'))
+    plies = args.plies
+    if plies is None:
+        plies = GameState(rows, columns).num_edges
+
+    start = time.perf_counter()
+    def report(count):
+        if count % 1000 == 0:
+            print('%d positions solved in %.0f seconds' % (count, time.perf_counter() - start))
+    entries = build(rows, columns, plies, report)
+    path = args.out or book_path(rows, columns)
+    write_book(path, rows, columns, entries)
+    print('%d positions written to %s in %.0f seconds' % (len(entries), path, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+'''
+    chains.py
+    Splits the open boxes of a GameState into chains, loops and junctions.
+
+    A box with two or more drawn sides has at most two ways out, so it can only be part of
+    a chain or a loop. Boxes like that which share an undrawn edge belong to the same
+    component. A component where every box leads to two others in it is a loop,
+    otherwise it is a chain. A box with fewer than two drawn sides is a junction. Junctions
+    are not kept as components, so a board that is mostly junctions, like every board early
+    in the game, does not need an object for each box.
+
+    The analyzer keeps the components between moves. When edges change, only the components
+    around the changed edges are walked again, so the cost of an update follows the
+    length of the chains touched and not the size of the board.
+'''
+import weakref
+
+
+CHAIN = 'chain'
+LOOP = 'loop'
+
+
+class Component:
+
+    __slots__ = ('kind', 'boxes')
+
+    def __init__(self, kind, boxes):
+        self.kind = kind
+        self.boxes = boxes
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __repr__(self):
+        return 'Component(%s, %r)' % (self.kind, self.boxes)
+
+
+class ChainAnalyzer:
+
+    def __init__(self, state):
+        self.state = state
+        #the edges drawn and taken back since the components were worked out
+        self.changes = state.changes()
+        #the component of every box, None for junctions and closed boxes
+        self.component = [None] * state.num_boxes
+        self.components = set()
+        self.rebuild(range(state.num_boxes))
+
+    def other_box(self, edge, box):
+        #the box on the other side of an edge, or None if the edge is on the border
+        boxes = self.state.edge_boxes[edge]
+        if len(boxes) == 1:
+            return None
+        return boxes[1] if boxes[0] == box else boxes[0]
+
+    def rebuild(self, boxes):
+        '''Walks the components of the given boxes again. Any other component that the walk
+            runs into is taken apart and walked again as well.
+        '''
+        state = self.state
+        sides = state.sides
+        drawn = state.drawn
+        pending = list(boxes)
+        for box in pending:
+            old = self.component[box]
+            if old is not None and old in self.components:
+                self.components.discard(old)
+                pending.extend(old.boxes)
+            self.component[box] = None
+        for start in pending:
+            if self.component[start] is not None or sides[start] == 4:
+                continue
+            if sides[start] < 2:
+                continue
+            component = Component(CHAIN, [])
+            links = 0
+            stack = [start]
+            self.component[start] = component
+            while stack:
+                box = stack.pop()
+                component.boxes.append(box)
+                for edge in state.box_edges[box]:
+                    if drawn[edge]:
+                        continue
+                    other = self.other_box(edge, box)
+                    if other is None or sides[other] < 2:
+                        continue
+                    links += 1
+                    found = self.component[other]
+                    if found is component:
+                        continue
+                    if found is not None:
+                        #this component was not walked again yet, so it is joined to this one
+                        self.components.discard(found)
+                        for moved in found.boxes:
+                            self.component[moved] = None
+                        pending.extend(found.boxes)
+                    self.component[other] = component
+                    stack.append(other)
+            #every link between two boxes was counted from both sides
+            if links // 2 == len(component.boxes) and len(component.boxes) > 2:
+                component.kind = LOOP
+            self.components.add(component)
+
+    def sync(self):
+        '''Brings the components up to date with the edges of the state. Only the
+            components next to edges that changed since the last call are walked again.
+        '''
+        changed = self.changes.take()
+        if not changed:
+            return self
+        touched = []
+        for edge in changed:
+            for box in self.state.edge_boxes[edge]:
+                touched.append(box)
+                for other_edge in self.state.box_edges[box]:
+                    other = self.other_box(other_edge, box)
+                    if other is not None:
+                        touched.append(other)
+        self.rebuild(touched)
+        return self
+
+    def ordered(self):
+        '''Returns the components sorted by their lowest box. The set of components is
+            walked in an order that changes from run to run, so the AI uses this one to
+            break ties the same way every time.
+        '''
+        self.sync()
+        return sorted(self.components, key=lambda component: min(component.boxes))
+
+    def component_of(self, box):
+        #the chain or loop that holds a box, None if the box is a junction or closed
+        self.sync()
+        return self.component[box]
+
+    def chains(self):
+        self.sync()
+        return [component for component in self.components if component.kind == CHAIN]
+
+    def loops(self):
+        self.sync()
+        return [component for component in self.components if component.kind == LOOP]
+
+    def junctions(self):
+        #the boxes that are junctions
+        sides = self.state.sides
+        return [box for box in range(self.state.num_boxes) if sides[box] < 2]
+
+    def sizes(self):
+        '''Returns the lengths of all chains and loops as two sorted lists.'''
+        self.sync()
+        chains = sorted(len(c) for c in self.components if c.kind == CHAIN)
+        loops = sorted(len(c) for c in self.components if c.kind == LOOP)
+        return chains, loops
+
+
+_analyzers = weakref.WeakKeyDictionary()
+
+def analyzer(state):
+    '''Returns the analyzer kept for a state, creating it the first time, and brings it
+        up to date with any moves played or taken back since it was last used.
+    '''
+    found = _analyzers.get(state)
+    if found is None:
+        #the analyzer only holds a weak reference, or the state would never be let go
+        found = ChainAnalyzer(weakref.proxy(state))
+        _analyzers[state] = found
+    return found.sync()
+
+
+def testModule(): #plays and takes back random moves and checks the kept analyzer against a new one
+    import random
+    from state import GameState
+
+    def found(analyzer):
+        return sorted((component.kind, sorted(component.boxes)) for component in analyzer.ordered())
+
+    rng = random.Random(0)
+    steps = 0
+    for game in range(400):
+        rows, columns = rng.choice([(2, 2), (3, 3), (3, 5), (4, 4), (6, 6)])
+        state = GameState(rows, columns)
+        while not state.game_over():
+            #now and then a few moves are taken back, so undo is checked as well as play
+            if state.history and rng.random() < 0.2:
+                for count in range(rng.randint(1, min(4, len(state.history)))):
+                    state.undo()
+            else:
+                state.play(rng.choice(state.legal_moves()))
+            assert found(analyzer(state)) == found(ChainAnalyzer(state)), (rows, columns, state.moves())
+            steps += 1
+    print('%d moves checked in 400 games' % steps)
+
+if __name__ == '__main__':
+    testModule()
@@ -0,0 +1,204 @@
+'''
+    client.py
+    Plays games on a match server (see server.py for the protocol). Match follows one game
+    from the lines the server sends, so any bot can keep a GameState of the game with it.
+    Connection is a plain blocking connection for scripts, and RemoteGame is used by
+    game1.py --server to play from the window.
+
+    The computer players can play on a server from here, e.g. ten games of the heuristic
+    player against another client asking for the same board:
+        python client.py localhost:7878 --size 3x3 --ai heuristic --games 10
+    or against a computer player on the server:
+        python client.py localhost:7878 --size 3x3 --ai heuristic --against alphabeta
+    An address without a port is taken as the path of a Unix socket.
+'''
+import argparse
+import queue
+import random
+import socket
+import threading
+
+import players
+from state import GameState
+
+
+class ServerError(Exception):
+    #the server answered with an ERROR line
+    pass
+
+
+class Match:
+    '''The state of one game as the server tells it. player is 0 or 1, the player this
+        client is, and once the game is over score, winner and reason are set from END.
+    '''
+
+    def __init__(self):
+        self.state = None
+        self.player = None
+        self.seconds = None
+        self.score = None
+        self.winner = None
+        self.reason = None
+
+    def receive(self, words):
+        '''Follows the game with one line from the server, split into words. Returns True
+            when the line asks this player to move. Raises ServerError for an ERROR line and
+            ConnectionError when the line is empty because the server went away.
+        '''
+        if not words:
+            raise ConnectionError('the server went away')
+        kind = words[0]
+        if kind == 'START':
+            rows, columns, self.player = (int(word) for word in words[1:4])
+            self.seconds = float(words[4])
+            self.state = GameState(rows, columns)
+        elif kind == 'MOVED':
+            player, edge = int(words[1]), int(words[2])
+            if player != self.state.player:
+                raise ValueError('player %d moved but it is the turn of player %d' % (player, self.state.player))
+            self.state.play(edge)
+        elif kind == 'END':
+            self.score = [int(words[1]), int(words[2])]
+            self.winner = int(words[3])
+            self.reason = words[4]
+        elif kind == 'ERROR':
+            raise ServerError(' '.join(words[1:]))
+        return kind == 'TURN'
+
+
+def parse_address(text):
+    #"host:port" for TCP, anything else is the path of a Unix socket
+    host, colon, port = text.rpartition(':')
+    if colon and port.isdigit():
+        return host, int(port)
+    return text
+
+
+class Connection:
+    #a blocking connection to a server, a line at a time
+
+    def __init__(self, address):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+        else:
+            self.socket = socket.create_connection(address)
+        self.lines = self.socket.makefile('rb')
+
+    def send(self, line):
+        self.socket.sendall((line + '\n').encode())
+
+    def read(self):
+        #the words of the next line, an empty list when the server went away
+        return self.lines.readline().decode().split()
+
+    def close(self):
+        self.lines.close()
+        self.socket.close()
+
+
+def play(connection, rows, columns, seconds, strategy='heuristic', against=None, rng=None, playouts=None):
+    '''Plays one game on the server with a computer player of players.py and returns the
+        Match. against names a computer player on the server to play, otherwise the server
+        pairs this client with another one asking for the same game. The player thinks for
+        half of the time control, or runs playouts playouts a move if it is mcts and they
+        are given.
+    '''
+    connection.send('PLAY %dx%d %s %s' % (rows, columns, seconds, against or ''))
+    match = Match()
+    while match.reason is None:
+        if match.receive(connection.read()):
+            move = players.find_move(match.state, strategy, seconds / 2, rng, playouts=playouts)
+            connection.send('MOVE %d' % move)
+    return match
+
+
+class RemoteGame:
+    '''A game on a server played from the window of game1.py. The lines from the server are
+        read in a thread, so the window keeps working while the opponent thinks. poll
+        follows the lines that came in and adds the opponent's moves among them to moves,
+        where they wait to be drawn.
+    '''
+
+    def __init__(self, address, rows, columns, seconds):
+        self.connection = Connection(address)
+        self.connection.send('PLAY %dx%d %s' % (rows, columns, seconds))
+        self.match = Match()
+        self.moves = []
+        self.lines = queue.Queue()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                words = self.connection.read()
+            except (OSError, ValueError):
+                #the connection was closed by close
+                words = []
+            self.lines.put(words)
+            if not words or words[0] == 'END':
+                return
+
+    def wait_start(self):
+        #blocks until the server has found an opponent, returns this player's number
+        while self.match.state is None:
+            self.match.receive(self.lines.get())
+        return self.match.player
+
+    def poll(self):
+        while self.match.reason is None:
+            try:
+                words = self.lines.get_nowait()
+            except queue.Empty:
+                break
+            if words[:1] == ['MOVED'] and int(words[1]) != self.match.player:
+                self.moves.append(int(words[2]))
+            self.match.receive(words)
+
+    def send_move(self, edge):
+        self.connection.send('MOVE %d' % edge)
+
+    def close(self):
+        try:
+            self.connection.send('QUIT')
+        except OSError:
+            #already closed, or the server went away
+            pass
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a computer player on a match server.')
+    parser.add_argument('address', help='host:port of the server, or the path of a Unix socket')
+    parser.add_argument('--size', default='3x3', help='the board size in boxes, like 3x3')
+    parser.add_argument('--seconds', type=float, default=10.0, help='seconds per move')
+    parser.add_argument('--ai', default='heuristic', choices=sorted(players.STRATEGIES),
+                        help='the computer player that plays from here')
+    parser.add_argument('--against', default=None,
+                        help='a computer player on the server to play, instead of another client')
+    parser.add_argument('--playouts', type=int, default=None,
+                        help='playouts per move for the mcts player instead of half the time control')
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    rows, columns = (int(number) for number in args.size.lower().split('x'))
+    rng = random.Random(args.seed)
+
+    connection = Connection(parse_address(args.address))
+    wins = 0
+    try:
+        for game in range(args.games):
+            match = play(connection, rows, columns, args.seconds, args.ai, args.against, rng, args.playouts)
+            wins += match.winner == match.player
+            print('game %d: player %d, score %d-%d, %s' % (game + 1, match.player, match.score[0],
+                                                         match.score[1], match.reason))
+        connection.send('QUIT')
+    finally:
+        connection.close()
+    print('won %d of %d' % (wins, args.games))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+'''
+    endgame.py
+    Plays the end of the game exactly. Once every open box has at least two sides drawn,
+    any edge that does not close a box gives boxes away, and the board is just a set of
+    separate chains and loops. The player to move has to open one of them. The other
+    player can then take all of it and move next, or keep control by taking all but the
+    last two boxes of a chain (or the last four of a loop) and handing those back with a
+    double-cross, so the first player has to open the next one.
+
+    value() works out the result of that kind of position from the chain and loop
+    lengths alone, without searching any moves: with the controlled value when the
+    player in control keeps it to the end, and with a table over the shortest chains and
+    loops otherwise.
+'''
+import chains
+
+
+def is_simple(state):
+    #every open box has two sides or more drawn, so the board is only chains and loops
+    return state.remaining > 0 and state.loose == 0
+
+
+def value(chain_lengths, loop_lengths, memo=None):
+    '''Returns the boxes the player to move will win minus the boxes the other player
+        will win from here on, when every chain and loop is closed off and the player to
+        move has to open one of them. Both arguments are sorted tuples of lengths.
+
+        Two chains of one (or of two) cancel out: whoever opens one of them can be answered
+        by taking it and opening the other, so only whether there is an odd one left
+        matters. Of the chains of three or more and the loops, only the smallest chain and
+        the smallest loop need to be tried, and what is left after opening them is always
+        the longest chains and loops. So the values are worked out in a table over how many
+        of the smallest chains and loops are gone, from the end, in about chains * loops
+        steps. A part of the table with no chain shorter than four whose controlled value
+        (see controlled_value) is at least 2 is filled in at once: the player who is not
+        to move keeps control to the end and wins the controlled value.
+    '''
+    if memo is None:
+        memo = {}
+    key = (chain_lengths, loop_lengths)
+    if key in memo:
+        return memo[key]
+    ones = chain_lengths.count(1) % 2
+    twos = chain_lengths.count(2) % 2
+    long_chains = [length for length in chain_lengths if length >= 3]
+    chain_count = len(long_chains)
+    loop_count = len(loop_lengths)
+    #the boxes in the chains from i on and in the loops from j on
+    chain_boxes = [0] * (chain_count + 1)
+    for i in range(chain_count - 1, -1, -1):
+        chain_boxes[i] = chain_boxes[i + 1] + long_chains[i]
+    loop_boxes = [0] * (loop_count + 1)
+    for j in range(loop_count - 1, -1, -1):
+        loop_boxes[j] = loop_boxes[j + 1] + loop_lengths[j]
+    found = controlled_value(chain_boxes[0] + loop_boxes[0], chain_count, loop_count,
+                             long_chains[0] if long_chains else None)
+    if not ones and not twos and found is not None:
+        memo[key] = -found
+        return -found
+    #later[j][ones][twos] is the value with the chains from i + 1 on and the loops from j
+    #on, row is the same for the chains from i on
+    later = None
+    for i in range(chain_count, -1, -1):
+        row = [None] * (loop_count + 1)
+        for j in range(loop_count, -1, -1):
+            cell = [[0, 0], [0, 0]]
+            rest = controlled_value(chain_boxes[i] + loop_boxes[j], chain_count - i, loop_count - j,
+                                    long_chains[i] if i < chain_count else None)
+            for one in (0, 1):
+                for two in (0, 1):
+                    if not one and not two and rest is not None:
+                        cell[0][0] = -rest
+                        continue
+                    best = None
+                    if one:
+                        best = -1 - cell[0][two]
+                    if two:
+                        gain = -2 - cell[one][0]
+                        if best is None or gain > best:
+                            best = gain
+                    if i < chain_count:
+                        gain = -opened_chain(long_chains[i], later[j][one][two])
+                        if best is None or gain > best:
+                            best = gain
+                    if j < loop_count:
+                        gain = -opened_loop(loop_lengths[j], row[j + 1][one][two])
+                        if best is None or gain > best:
+                            best = gain
+                    cell[one][two] = 0 if best is None else best
+            row[j] = cell
+        later = row
+    found = later[0][ones][twos]
+    memo[key] = found
+    return found
+
+
+def controlled_value(boxes, chain_count, loop_count, shortest_chain):
+    '''Returns what the player who is not to move wins by keeping control of every chain
+        and loop but the last, which is a chain if there is one: all but two boxes of
+        every other chain and all but four of every other loop. That is the value of the
+        position when it is at least 2 and there is no chain of three, and then it is
+        returned. Otherwise, or with no chain or loop left, it returns None. The position
+        is given by its boxes, its chains of three or more, its loops and the length of
+        its shortest chain, None without a chain.
+    '''
+    if chain_count + loop_count == 0 or shortest_chain == 3:
+        return None
+    found = boxes - 4 * chain_count - 8 * loop_count + (4 if chain_count else 8)
+    return found if found >= 2 else None
+
+
+def opened_chain(length, rest):
+    '''Returns what the player who answers an opened chain wins from here on, where rest
+        is the value of the remaining chains and loops for the player to move in them.
+        Chains of one or two are opened so that they cannot be handed back.
+    '''
+    if length < 3:
+        return length + rest
+    return max(length + rest, length - 4 - rest)
+
+
+def opened_loop(length, rest):
+    #the same for a loop, where keeping control gives four boxes back instead of two
+    return max(length + rest, length - 8 - rest)
+
+
+def lengths(analysis, skip=None):
+    #the sorted chain and loop lengths of the position, leaving out one component
+    chain_lengths = []
+    loop_lengths = []
+    for component in analysis.ordered():
+        if component is skip:
+            continue
+        if component.kind == chains.LOOP:
+            loop_lengths.append(len(component))
+        else:
+            chain_lengths.append(len(component))
+    return tuple(sorted(chain_lengths)), tuple(sorted(loop_lengths))
+
+
+def find_move(state):
+    '''Returns the best edge when the board is only chains and loops, or None when it is
+        not and the endgame cannot be worked out this way.
+    '''
+    if not is_simple(state):
+        return None
+    analysis = chains.analyzer(state)
+    open_now = [component for component in analysis.ordered()
+                if any(state.sides[box] == 3 for box in component.boxes)]
+    if open_now:
+        return capture_move(state, analysis, open_now)
+    return open_move(state, analysis)
+
+
+def capture_move(state, analysis, open_now):
+    '''The other player has opened a chain or loop. Decides whether to take all of it and
+        open the next one, or to keep control by handing the last boxes back. When more
+        than one can be taken, the ones that can not be handed back are taken first, then
+        all but one of the others, and the decision is made on the last one.
+    '''
+    ends = {}
+    for component in open_now:
+        ends[component] = [box for box in component.boxes if state.sides[box] == 3]
+    #a chain opened at one end hands two boxes back, one with both ends open (like an opened
+    #loop) hands four back, and one too short for that can only be taken
+    handback = {component: 4 if len(ends[component]) == 2 else 2 for component in open_now}
+    for component in open_now:
+        if len(component) < handback[component]:
+            return closing_edge(state, ends[component][0])
+    #handing back two boxes costs less than four, so a chain is kept for last
+    open_now.sort(key=lambda component: handback[component])
+    if len(open_now) > 1:
+        other = open_now[-1]
+        return closing_edge(state, ends[other][0])
+    component = open_now[0]
+    size = len(component)
+    memo = {}
+    rest = value(*lengths(analysis, component), memo=memo)
+    keep_control = (size - handback[component]) - handback[component] - rest > size + rest
+    if keep_control and size == handback[component]:
+        return double_deal(state, component, ends[component])
+    return closing_edge(state, ends[component][0])
+
+
+def closing_edge(state, box):
+    #the one undrawn side of a box with three sides drawn
+    for edge in state.box_edges[box]:
+        if not state.is_drawn(edge):
+            return edge
+
+
+def double_deal(state, component, ends):
+    '''Returns the edge that hands the last boxes of an opened chain or loop back without
+        closing any. For a chain that is the far side of the second box, for a loop it is
+        the edge in the middle of the four boxes.
+    '''
+    if len(ends) == 1:
+        first = ends[0]
+        second = next(box for box in component.boxes if box != first)
+        for edge in state.box_edges[second]:
+            if not state.is_drawn(edge) and first not in state.edge_boxes[edge]:
+                return edge
+    order = walk(state, component, ends[0])
+    middle = set(state.box_edges[order[1]]) & set(state.box_edges[order[2]])
+    return middle.pop()
+
+
+def walk(state, component, start):
+    #the boxes of a chain in order, starting from one end
+    members = set(component.boxes)
+    order = [start]
+    previous = None
+    box = start
+    while len(order) < len(members):
+        for edge in state.box_edges[box]:
+            if state.is_drawn(edge):
+                continue
+            nexts = [other for other in state.edge_boxes[edge] if other != box and other in members]
+            if nexts and nexts[0] != previous:
+                previous, box = box, nexts[0]
+                order.append(box)
+                break
+        else:
+            break
+    return order
+
+
+def open_move(state, analysis):
+    '''Every edge gives something away. Opens the chain or loop that leaves the best
+        value, and opens it so that the other player gets the fewest options.
+    '''
+    memo = {}
+    best = None
+    best_component = None
+    for component in candidates(analysis):
+        rest = value(*lengths(analysis, component), memo=memo)
+        if component.kind == chains.LOOP:
+            gain = -opened_loop(len(component), rest)
+        else:
+            gain = -opened_chain(len(component), rest)
+        if (best is None or gain > best or
+                (gain == best and len(component) < len(best_component))):
+            best = gain
+            best_component = component
+    return opening_edge(state, best_component)
+
+
+def candidates(analysis):
+    '''The components worth opening, as value() finds: a chain of one, a chain of two,
+        the shortest longer chain and the shortest loop.
+    '''
+    found = {}
+    for component in analysis.ordered():
+        size = len(component)
+        if component.kind == chains.LOOP:
+            kind = chains.LOOP
+        else:
+            kind = size if size < 3 else chains.CHAIN
+        if kind not in found or size < len(found[kind]):
+            found[kind] = component
+    return list(found.values())
+
+
+def opening_edge(state, component):
+    '''A chain of two is opened in the middle so it cannot be handed back, a longer chain
+        from one end and a loop anywhere.
+    '''
+    boxes = component.boxes
+    if component.kind == chains.CHAIN and len(boxes) == 2:
+        return (set(state.box_edges[boxes[0]]) & set(state.box_edges[boxes[1]])).pop()
+    if component.kind == chains.CHAIN:
+        #an end box has an undrawn edge that does not lead to another box of the chain
+        members = set(boxes)
+        for box in boxes:
+            for edge in state.box_edges[box]:
+                if state.is_drawn(edge):
+                    continue
+                if not any(other in members for other in state.edge_boxes[edge] if other != box):
+                    return edge
+    for edge in state.box_edges[boxes[0]]:
+        if not state.is_drawn(edge):
+            return edge
+
+
+def brute_force(state, memo):
+    #the exact value of a position by trying every move, for checking find_move
+    if state.remaining == 0:
+        return 0
+    key = bytes(state.drawn)
+    if key in memo:
+        return memo[key]
+    best = None
+    for move in state.legal_moves():
+        found = move_value(state, move, memo)
+        if best is None or found > best:
+            best = found
+    memo[key] = best
+    return best
+
+
+def move_value(state, move, memo):
+    closed = len(state.play(move))
+    found = closed + brute_force(state, memo) if closed else -brute_force(state, memo)
+    state.undo()
+    return found
+
+
+def testModule(): #checks find_move against trying every move on random small endgames
+    import random
+    import ai
+    from state import GameState
+
+    checked = several = 0
+    memos = {}
+    for seed in range(1500):
+        rng = random.Random(seed)
+        rows, columns = rng.choice([(2, 2), (2, 3), (3, 2), (3, 3), (2, 4)])
+        state = GameState(rows, columns)
+        #safe moves until only chains and loops are left, then a few moves of any kind,
+        #which leaves some chains opened and some boxes handed back at the same time
+        while True:
+            safe = [edge for edge in state.legal_moves() if ai.neighbor_count(state, edge) < 2]
+            if not safe:
+                break
+            state.play(rng.choice(safe))
+        for count in range(rng.randint(0, 6)):
+            if state.remaining > 0:
+                state.play(rng.choice(state.legal_moves()))
+        if not is_simple(state):
+            continue
+        memo = memos.setdefault((rows, columns), {})
+        open_now = [component for component in chains.analyzer(state).ordered()
+                    if any(state.sides[box] == 3 for box in component.boxes)]
+        several += len(open_now) > 1
+        move = find_move(state)
+        assert move_value(state, move, memo) == brute_force(state, memo), (rows, columns, state.moves())
+        checked += 1
+    print('%d endgames checked, %d with more than one chain to take' % (checked, several))
+
+    #value against opening every chain and loop in turn, on lists of lengths too long for a board
+    def searched(chain_lengths, loop_lengths, memo):
+        if not chain_lengths and not loop_lengths:
+            return 0
+        key = (chain_lengths, loop_lengths)
+        if key not in memo:
+            found = [-opened_chain(length, searched(chain_lengths[:index] + chain_lengths[index + 1:],
+                                                    loop_lengths, memo))
+                     for index, length in enumerate(chain_lengths)]
+            found += [-opened_loop(length, searched(chain_lengths, loop_lengths[:index] + loop_lengths[index + 1:],
+                                                    memo))
+                      for index, length in enumerate(loop_lengths)]
+            memo[key] = max(found)
+        return memo[key]
+
+    rng = random.Random(0)
+    memo = {}
+    for number in range(20000):
+        chain_lengths = tuple(sorted(rng.choice([1, 2, 3, 3, 4, 5, 6, 8, 11])
+                                     for count in range(rng.randint(0, 6))))
+        loop_lengths = tuple(sorted(rng.choice([4, 4, 6, 8, 10, 12]) for count in range(rng.randint(0, 4))))
+        found = searched(chain_lengths, loop_lengths, memo)
+        assert value(chain_lengths, loop_lengths) == found, (chain_lengths, loop_lengths)
+    print('20000 chain and loop lengths checked against a search')
+
+if __name__ == '__main__':
+    testModule()
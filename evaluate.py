@@ -0,0 +1,262 @@
+'''
+    evaluate.py
+    Scores saved positions without a window: evaluate takes a position written as text and
+    returns every legal move with its value, best first. Nothing is played on a board and
+    nothing is kept, so the same position always gives the same answer. evaluate_many
+    streams many positions through a pool of processes and works out every position only
+    once, mirror images and turns included.
+        python evaluate.py positions.txt --workers 4 > values.jsonl
+    python evaluate.py --test checks exact values against trying every move, and the pool
+    against single calls.
+
+    A position is the board size followed by the edges drawn so far in the order they were
+    played (see state.py), like "3x3 0 5 12", which is what encode_position writes. Boards
+    go from 1x1 up to MAX_BOXES boxes. The value of a move is the boxes still to be won by
+    the player to move minus the boxes the other player will win, if the move is played and
+    both players play on well. The best value plus the score so far is the margin the
+    player to move can expect to finish with.
+
+    Positions with at most EXACT_EDGES undrawn edges are solved exactly with the solver of
+    book.py. Bigger ones are searched with alpha-beta (search.py) as deep as NODES allows,
+    and their values are only estimates; the result says which it is.
+'''
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
+import sys
+
+import book
+import search
+from state import GameState
+
+
+#positions with this many undrawn edges or fewer are solved exactly
+EXACT_EDGES = 16
+#about how many positions the alpha-beta search of a bigger position may look at
+NODES = 50000
+#the biggest board that is evaluated, in boxes, since every move of a position is searched
+MAX_BOXES = 2500
+
+
+def encode_position(rows, columns, moves):
+    return ' '.join(['%dx%d' % (rows, columns)] + [str(edge) for edge in moves])
+
+
+def decode_position(text):
+    '''Returns the GameState of a position written by encode_position. Raises ValueError
+        when the text is not a position, the board is smaller than 1x1 or bigger than
+        MAX_BOXES, or an edge is drawn twice.
+    '''
+    words = text.split()
+    if not words:
+        raise ValueError('an empty position')
+    try:
+        rows, columns = (int(number) for number in words[0].lower().split('x'))
+        moves = [int(word) for word in words[1:]]
+    except ValueError:
+        raise ValueError('not a position: %r' % text)
+    if rows < 1 or columns < 1 or rows * columns > MAX_BOXES:
+        raise ValueError('boards go from 1x1 to %d boxes, not %dx%d in %r' % (MAX_BOXES, rows, columns, text))
+    state = GameState(rows, columns)
+    for edge in moves:
+        if not 0 <= edge < state.num_edges or state.is_drawn(edge):
+            raise ValueError('edge %d can not be drawn in %r' % (edge, text))
+        state.play(edge)
+    return state
+
+
+def search_depth(moves):
+    #the deepest search of a position with this many moves that stays near NODES
+    if moves < 2:
+        return 1
+    return max(1, int(math.log(NODES) / math.log(moves)))
+
+
+def move_values(state, exact_edges=EXACT_EDGES):
+    #the (move, value) of every undrawn edge and whether the values are exact
+    undrawn = state.num_edges - len(state.history)
+    if undrawn <= exact_edges:
+        return book.Solver().values(state), True
+    searcher = search.AlphaBeta(search.TranspositionTable(1 << 16))
+    return searcher.values(state, search_depth(undrawn)), False
+
+
+def ranked(values):
+    #best first, and the lowest edge first between equal values so the order never changes
+    return [[move, value] for move, value in sorted(values, key=lambda item: (-item[1], item[0]))]
+
+
+def evaluate(position, exact_edges=EXACT_EDGES):
+    '''Returns the moves of a position with their values, as a dictionary that can be
+        written as JSON: the position, the player to move, the score so far, whether the
+        values are exact and the moves as [move, value] pairs, best first.
+    '''
+    state = decode_position(position)
+    values, exact = move_values(state, exact_edges)
+    return {'position': position, 'player': state.player, 'score': list(state.score),
+            'exact': exact, 'moves': ranked(values)}
+
+
+def cache_key(state, exact_edges=EXACT_EDGES):
+    '''Positions that are mirror images or turns of each other share a key, k turns the
+        moves. The values depend on how many undrawn edges are solved exactly, so that is
+        part of the key as well.
+    '''
+    key, k = state.canonical()
+    return (state.rows, state.columns, key, exact_edges), k
+
+
+def evaluate_many(positions, workers=None, cache=None, exact_edges=EXACT_EDGES):
+    '''Yields evaluate() of every position, in the order given. positions can be any
+        iterable of position texts, and only a few per worker are read ahead, so it can be
+        a file with millions of lines. Results are kept in cache, a dictionary that can be
+        passed in to be used again, by canonical position: a position that was already
+        worked out, or is the mirror image of one, is not sent to the pool again. A line
+        that is not a position gives {'position': ..., 'error': ...} and the rest of the
+        positions are still worked out.
+    '''
+    workers = workers or os.cpu_count() or 1
+    if cache is None:
+        cache = {}
+    #the positions read but not yet yielded, as (position, state, key, k), or as
+    #(position, None, error, None) for a line that is not a position
+    waiting = deque()
+    #the evaluations still in the pool, by key
+    running = {}
+
+    def finished(block):
+        #the results at the head of the queue that are ready, in order
+        done = []
+        while waiting:
+            position, state, key, k = waiting[0]
+            if state is None:
+                waiting.popleft()
+                done.append({'position': position, 'error': key})
+                block = False
+                continue
+            if key not in cache:
+                future = running[key]
+                if not block and not future.done():
+                    break
+                result = future.result()
+                del running[key]
+                #the moves are kept turned to the canonical position
+                cache[key] = (result['exact'], [(state.permutations[k][move], value)
+                                                for move, value in result['moves']])
+            waiting.popleft()
+            exact, values = cache[key]
+            done.append({'position': position, 'player': state.player, 'score': list(state.score),
+                         'exact': exact, 'moves': ranked((state.inverses[k][move], value)
+                                                         for move, value in values)})
+            block = False
+        return done
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for position in positions:
+            position = position.strip()
+            try:
+                state = decode_position(position)
+            except ValueError as error:
+                waiting.append((position, None, str(error), None))
+            else:
+                key, k = cache_key(state, exact_edges)
+                if key not in cache and key not in running:
+                    running[key] = pool.submit(evaluate, position, exact_edges)
+                waiting.append((position, state, key, k))
+            for result in finished(len(running) >= workers * 2):
+                yield result
+        while waiting:
+            for result in finished(True):
+                yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every move of saved positions.')
+    parser.add_argument('positions', nargs='?',
+                        help='a file with a position on every line, like "3x3 0 5 12", or - to read them from stdin')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, all cores by default')
+    parser.add_argument('--exact', type=int, default=EXACT_EDGES,
+                        help='solve positions with at most this many undrawn edges exactly')
+    parser.add_argument('--test', action='store_true', help='check the batch against single positions and stop')
+    args = parser.parse_args()
+    if args.test:
+        testModule()
+        return
+    if args.positions is None:
+        parser.error('a file of positions is needed unless --test is given')
+    lines = sys.stdin if args.positions == '-' else open(args.positions)
+    try:
+        for result in evaluate_many((line for line in lines if line.strip()), args.workers, exact_edges=args.exact):
+            print(json.dumps(result))
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def testModule(): #checks exact values by trying every move, and the batch against single calls
+    import random
+    import endgame
+    import symmetry
+    import time
+
+    rng = random.Random(0)
+    positions = []
+    for number in range(40):
+        rows, columns = rng.choice([(2, 2), (3, 3), (4, 4), (6, 6)])
+        state = GameState(rows, columns)
+        moves = state.legal_moves()
+        rng.shuffle(moves)
+        moves = moves[:max(0, state.num_edges - rng.randint(8, 40))]
+        positions.append(encode_position(rows, columns, moves))
+        #the same position turned around
+        permutation = rng.choice(symmetry.edge_permutations(rows, columns))
+        positions.append(encode_position(rows, columns, [permutation[edge] for edge in moves]))
+
+    start = time.perf_counter()
+    single = [evaluate(position) for position in positions]
+    middle = time.perf_counter()
+    cache = {}
+    batch = list(evaluate_many(positions, cache=cache))
+    end = time.perf_counter()
+    assert [result['position'] for result in batch] == positions
+    for one, other in zip(single, batch):
+        assert one['exact'] == other['exact']
+        assert [value for move, value in one['moves']] == [value for move, value in other['moves']]
+        if one['exact']:
+            assert one['moves'] == other['moves']
+    assert len(cache) <= len(positions) // 2
+
+    #a line that is not a position is reported and the lines after it are still worked out,
+    #and a cache used with another exact_edges does not give the old values
+    bad = ['3x3 0 0', 'not a position', '0x0', '-1x3 2', '1000x1000']
+    again = list(evaluate_many(bad[:1] + positions[:4] + bad[1:], cache=cache, exact_edges=0))
+    assert [result['position'] for result in again] == bad[:1] + positions[:4] + bad[1:]
+    assert 'error' in again[0] and all('error' in result for result in again[5:])
+    assert not any(result['exact'] for result in again[1:5])
+
+    #the solver and endgame.py are checked against a search that tries every move
+    checked = 0
+    memos = {}
+    for number in range(300):
+        rows, columns = rng.choice([(2, 2), (2, 3), (3, 3)])
+        state = GameState(rows, columns)
+        moves = state.legal_moves()
+        rng.shuffle(moves)
+        position = encode_position(rows, columns, moves[:state.num_edges - rng.randint(1, EXACT_EDGES)])
+        result = evaluate(position)
+        assert result['exact']
+        state = decode_position(position)
+        memo = memos.setdefault((rows, columns), {})
+        for move, value in result['moves']:
+            assert endgame.move_value(state, move, memo) == value, (position, move, value)
+            checked += 1
+    print('%d exact values checked' % checked)
+    print('%d positions: %.1f s one at a time, %.1f s in the pool, %d worked out'
+          % (len(positions), middle - start, end - middle, len(cache)))
+    print(json.dumps(single[1]))
+
+if __name__ == '__main__':
+    main()
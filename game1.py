@@ -4,222 +4,90 @@
     This is version of the game dots and boxes. A human player plays against the computer.
     At the beginning, the user is asked to input the number of boxes in a column and a row
     of the gameboard, and then the game begins. When it is over you click to exit.
+    The computer thinks in the background, so the window keeps working while it does.
+    Pressing space makes it move right away with the best move it has found so far.
+    Pressing u takes back your last move along with the computer's answer, and r plays
+    them again.
+    With --server HOST:PORT the game is played on a match server (see server.py) against
+    whoever asks there for the same board, instead of against the computer.
 
 '''
 from board import *
 from graphics import *
-import time
+import argparse
 import random
+import threading
+import client
+import players
+import records
 
 
-def find_move(gameboard, win):
-    '''This function loops through the elements in the board and checks if it is a line
-        that has not been drawn. It then calls complete_square to see if it can complete a square. Otherwise
-        it finds the line with the least number of neighbors drawn.
+class ComputerMove:
+    '''Works out the computer's move in a worker thread so the window keeps answering
+        clicks and keys while the computer thinks. The computer player looks at a copy of
+        the game state, so the board can not change under it. move_now tells a searching
+        player to give its best move so far, and cancel throws the move away.
     '''
-    min = 4 #set to 4 initially so that even 3 neighbors will trigger the line to be drawn
-    i_min = 0
-    j_min = 1
-    forced_choices = [] #when the minimum is 2 neighbors a list of the potential places is used
-    noNeighbors = []
-    oneNeighbors = []
-    twoNeighbors = []
-    for j in range(len(gameboard.board)):
-        row = gameboard.board[j]
-        for i in range(len(row)):
-            #Checks if it is a line
-            if (i % 2 == 0 and j % 2 != 0) or (i % 2 != 0 and j % 2 == 0):
-                #Checks if it is drawn
-                if gameboard.draw_values[j][i] == False:
-                    #Checks if drawing it will complete a square
-                    if complete_square(gameboard, win, j, i):
-                        if double_cross_check(gameboard, win, j, i) and double_cross_play(gameboard, win, j, i):
-                            return
-                        else:
-                            gameboard.draw(win, j, i)
-                            return
-                    else:
-                        localmin = neighbor_count(gameboard, win, j, i)
-                        #This checks if the number of neighbor lines of this line is less than the minimum so far
-                        if localmin < min:
-                            min = localmin
-                            i_min = i
-                            j_min = j
-                        if localmin == 0:
-                            noNeighbors.append([j,i])
-                        elif localmin == 1:
-                            oneNeighbors.append([j,i])
-                        else:
-                            twoNeighbors.append([j,i])
-    #for minimum neighbors of 0 or 1 we pick a random place to draw line
-    if min == 0:
-        index = random.randint(0,len(noNeighbors)-1)
-        j_min = noNeighbors[index][0]
-        i_min = noNeighbors[index][1]
-    elif min == 1:
-        index = random.randint(0,len(oneNeighbors)-1)
-        j_min = oneNeighbors[index][0]
-        i_min = oneNeighbors[index][1]
-    #Finds move where human completes the least squares when human will complete at least 1
-    elif min == 2:
-        optimal = forced_move(gameboard, win, twoNeighbors)
-        j_min = optimal[0]
-        i_min = optimal[1]
-    gameboard.draw(win, j_min, i_min)
-    return
-
-def double_cross_check(gameboard, win, j, i):
-    '''Checks to see whether a double_cross move is appropriate. This is when there
-        are two boxes remaining in the chain, and the next chain is larger than 2.
-    '''
-    nextChain = 0
-    gameboard.alt_draw(win, j, i)
-    numComplete = 1 #set to one since we already drew one line in alt_draw list
-    while calc_routes(gameboard, win, False, 0, 0):
-        numComplete += 1
-    #Loop through board and see what the size of largest remaining chain is
-    for j in range(len(gameboard.board)):
-        row = gameboard.board[j]
-        for i in range(len(row)):
-            #Checks if it is a line
-            if (i % 2 == 0 and j % 2 != 0) or (i % 2 != 0 and j % 2 == 0):
-                #Checks if it is drawn
-                if gameboard.draw_values[j][i] == False:
-                    #Checks if it will be 3rd side of square
-                    if neighbor_count(gameboard, win, j, i) == 2:
-                        #checks how long the chain is
-                        gameboard.alt_draw(win, j, i)
-                        length = 0
-                        while calc_routes(gameboard, win, False, 0, 0):
-                            length += 1
-                        if length > nextChain:
-                            nextChain = length
-    gameboard.clear_alts(win)
-    #We want there to be only two boxes left in the chain and the next chain to be greater than 2
-    if nextChain > 2 and numComplete == 2:
-        return True
-    return False
-
-def double_cross_play(gameboard, win, j_check, i_check):
-    '''Finds the location where the double-cross move should be played, which
-        sacrifices two squares to the opponent. If it is not possible to double-cross
-        then it returns False
-    '''
-    for j in range(len(gameboard.board)):
-        row = gameboard.board[j]
-        for i in range(len(row)):
-            #Checks if it is a line
-            if (i % 2 == 0 and j % 2 != 0) or (i % 2 != 0 and j % 2 == 0):
-                #Checks if it is drawn
-                if gameboard.draw_values[j][i] == False:
-                    #Checks if it will be 3rd side of square
-                    if neighbor_count(gameboard, win, j, i) == 2:
-                        #checks if this is current chain
-                        if calc_routes(gameboard, win, True, j, i):
-                            gameboard.draw(win, j, i)
-                            gameboard.clear_alts(win)
-                            return True
-            gameboard.clear_alts(win)
-    gameboard.clear_alts(win)
-    return False
-
-def forced_move(gameboard, win, forced_choices):
-    '''loops through the options and selects the one that will give the human
-        the least number of complete squares.
-    '''
-    best_pair = forced_choices[0]
-    minComplete = -1 #set to negative 1 so it will always be beaten initially
-    for pair in forced_choices:
-        gameboard.alt_draw(win,pair[0],pair[1])
-        numComplete = 0
-        while calc_routes(gameboard, win, False, 0, 0):
-            numComplete += 1
-        if numComplete < minComplete or minComplete < 0:
-            minComplete = numComplete
-            best_pair = pair
-        #clears the alt_values since the analysis of the board is complete
-        gameboard.clear_alts(win)
-    return best_pair
-
-def calc_routes(gameboard, win, cross, cross_j, cross_i):
-    '''This function is ran to see how many boxes a player will be able to
-        complete next if a choice is taken
-        The cross, cross_j, and cross_i parameters are only used when using
-        double cross strategy, otherwise they are set to False, 0, 0
-    '''
-    for j in range(len(gameboard.board)):
-        row = gameboard.board[j]
-        for i in range(len(row)):
-            #Checks if it is a line
-            if (i % 2 == 0 and j % 2 != 0) or (i % 2 != 0 and j % 2 == 0):
-                #Checks if it is drawn
-                if gameboard.draw_values[j][i] == False and gameboard.alt_values[j][i] == False:
-                    #Checks if drawing it will complete a square
-                    #when double crossing theis means that it was the obvious move
-                    if complete_square(gameboard, win, j, i):
-                        gameboard.alt_draw(win, j, i)
-                        #If double crossing we want to see if the potential double cross spot would
-                        #be able to complete a square if the obvious choice was filled in
-                        if cross and complete_square(gameboard, win, cross_j, cross_i):
-                            return True
-                        if not cross:
-                            return True
-    return False
-
-def complete_square(gameboard, win, j, i):
-    '''This function returns whether a move will complete a square by looping through the list of
-        a lines neighbors to see how many are drawn.
-    '''
-    count = 0
-    neighbors = gameboard.find_neighbors(win, j, i)
-    for neighbor in neighbors:
-        for drawvalue in neighbor:
-             if drawvalue == True:
-                count += 1
-        if count == 3:
-            return True
-        count = 0
-    return False
-
-
-
-def neighbor_count(gameboard, win, j, i):
-    '''Looks at the neighbor lines for a specific line and returns the number of
-        neighbor lines that are drawn. If the line has two sets of neighbors (it is not an
-        edge line), then it returns the higher number of the two sets.
+
+    def __init__(self, state, strategy='heuristic', think_time=1.0, rng=None, playouts=None):
+        self.stop = threading.Event()
+        self.cancelled = False
+        self.move = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(state.copy(), strategy, think_time, rng, playouts))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, state, strategy, think_time, rng, playouts):
+        try:
+            self.move = players.find_move(state, strategy, think_time, rng, self.stop, playouts=playouts)
+        except Exception as error:
+            self.error = error
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def move_now(self):
+        self.stop.set()
+
+    def cancel(self):
+        #waits for the worker to stop, so two searches never share a player's tables
+        self.cancelled = True
+        self.stop.set()
+        self.thread.join()
+
+
+def find_move(gameboard, win, computer):
+    '''This function draws the line of a finished computer move. Errors from the worker
+        thread are raised here.
     '''
-    counts = []
-    neighbors = gameboard.find_neighbors(win, j, i)
-    for neighbor in neighbors:
-        count = 0
-        for value in neighbor:
-            if value == True:
-                count += 1
-        counts.append(count)
-    return max(counts)
-
-
-def display_result(win, gameboard, winHeight, winWidth):
+    if computer.error is not None:
+        raise computer.error
+    j, i = gameboard.state.edge_coords(computer.move)
+    gameboard.draw(win, j, i)
+
+
+def display_result(win, gameboard, winHeight, winWidth, opponent='computer'):
     '''This function desplays the score at the end of the game. It prints a phrase
         stating who the winner is and then it prints the scores of the human and the
-        computer.
+        computer, or of the opponent on a server.
     '''
     if gameboard.square_count1 > gameboard.square_count2:
         result = Text(Point(winWidth / 2, 10), "YOU ARE THE WINNER!!!")
         result.setTextColor("purple")
         result.draw(win)
     elif gameboard.square_count1 < gameboard.square_count2:
-        result = Text(Point(winWidth / 2, 10),  "THE COMPUTER BEAT YOU!")
+        result = Text(Point(winWidth / 2, 10),  "THE " + opponent.upper() + " BEAT YOU!")
         result.setTextColor("purple")
         result.draw(win)
     else:
 
-        result = Text(Point(winWidth / 2, 10), "WOW YOU TIED WITH THE COMPUTER!")
+        result = Text(Point(winWidth / 2, 10), "WOW YOU TIED WITH THE " + opponent.upper() + "!")
         result.setTextColor("purple")
         result.draw(win)
 
     your_score = Text(Point(winWidth / 2, 30), "Your Score: " + str(gameboard.square_count1))
-    comp_score = Text(Point(winWidth / 2, 50), "The Computer's Score: " + str(gameboard.square_count2))
+    comp_score = Text(Point(winWidth / 2, 50), "The " + opponent.capitalize() + "'s Score: " + str(gameboard.square_count2))
     your_score.setTextColor("red")
     comp_score.setTextColor("blue")
     your_score.draw(win)
@@ -234,51 +102,163 @@ def main():
         containing boxes, dots, and lines) to get the correct row value. A gameboard with
         rows of length greater than 12 or columns of length greater than 25
         do not fit the display window well. Decimal values will be converted to an integer.
+        The computer player and its thinking time can be picked on the command line,
+        and a file can be given to keep the finished game in. With a server the opponent
+        is a player on the server and the lines come from there instead.
     '''
+    parser = argparse.ArgumentParser(description='Play dots and boxes against the computer.')
+    parser.add_argument('--ai', default='heuristic', choices=sorted(players.STRATEGIES),
+                        help='the computer player to play against')
+    parser.add_argument('--think', type=float, default=1.0,
+                        help='seconds the computer may think per move, for searching players')
+    parser.add_argument('--playouts', type=int, default=None,
+                        help='playouts per move for the mcts player instead of --think')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the computer\'s random choices, to play the same game again')
+    parser.add_argument('--record', default=None,
+                        help='file to add the finished game to, see records.py')
+    parser.add_argument('--server', default=None,
+                        help='host:port of a match server to play on, see server.py')
+    parser.add_argument('--seconds', type=float, default=60.0,
+                        help='seconds per move on the server')
+    args = parser.parse_args()
+    if args.seed is None:
+        args.seed = random.randrange(1 << 31)
+    print("Seed for this game:", args.seed)
+    rng = random.Random(args.seed)
+
     rows = int(input("How many boxes in a column do you want (whole number between 2 and 12): ")) * 2
     columns = int(input("How many boxes in a row do you want( whole number between 2 and 25): ")) * 2
 
     if rows > 24 or columns > 50:
         print("your gameboard is too big for the screen")
 
+    remote = None
+    if args.server:
+        remote = client.RemoteGame(client.parse_address(args.server), rows // 2, columns // 2, args.seconds)
+        print("Waiting for an opponent on", args.server)
+        try:
+            player = remote.wait_start()
+        except (client.ServerError, ConnectionError) as error:
+            #there is no window yet, so the answer is printed
+            print("The server did not start the game:", error)
+            remote.close()
+            return
+        print("You move", "first" if player == 0 else "second", "with", args.seconds, "seconds a move")
+
     #This scales the width and height of the window depending on the size of the playing grid
     winHeight = 40 * rows + 200
     winWidth = 40 * columns + 200
-    win = GraphWin('Dots and Boxes', winWidth, winHeight)
+    #the window is only updated once a move, see Board.flush
+    win = GraphWin('Dots and Boxes', winWidth, winHeight, autoflush=False)
     win.setBackground("white")
 
     #This displays the players and their color value for when the complete a square
     guide1 = Text(Point(25, 10), "You: Red")
     guide1.setTextColor("red")
     guide1.draw(win)
-    guide2 = Text(Point(40, 30), "Computer: Blue")
+    guide2 = Text(Point(40, 30), "Computer: Blue" if remote is None else "Opponent: Blue")
     guide2.setTextColor("blue")
     guide2.draw(win)
 
     # make a board and draw it in the window(we give 50 for the number of pixels between dots)
     gameboard = Board(rows, columns, 50, winHeight, winWidth)
     gameboard.build_board(win)
+    #on a server the opponent can move first, the board only knows whose turn it is
+    if remote is not None and remote.match.player == 1:
+        gameboard.move = 1
+
+    if remote is None:
+        print("Press space to make the computer move now, u to take your last move back, r to play it again"
+              " or Escape to quit.")
+    computer = None
+    #the last ERROR from the server, shown under the board
+    notice = None
+    while not win.isClosed():
+        key = win.checkKey()
+        if key == 'Escape':
+            break
+        if remote is not None:
+            try:
+                remote.poll()
+            except (client.ServerError, ConnectionError) as error:
+                #the game goes on after an ERROR, and the window stays open if the server goes away
+                if notice is None:
+                    notice = Text(Point(winWidth / 2, winHeight - 20), "")
+                    notice.setTextColor("purple")
+                    notice.draw(win)
+                notice.setText("Server: " + str(error))
+
+        #undo takes back the computer's lines and then the human's last line, not on a server
+        if remote is None and key == 'u':
+            if computer is not None:
+                computer.cancel()
+                computer = None
+            while gameboard.undo(win) == 1:
+                pass
+        #redo puts back the human's line and the computer's lines after it
+        elif remote is None and key == 'r' and gameboard.redone:
+            if computer is not None:
+                computer.cancel()
+                computer = None
+            gameboard.redo(win)
+            while gameboard.move == 1 and gameboard.redo(win):
+                pass
 
-    while win.winfo_exists():
         #when gameboard.move = 0 it is the human's turn
         if gameboard.move == 0:
-            gameboard.click(win)
-            gameboard.check_square(win, 'red')
-        time.sleep(0.2)
+            clickPoint = win.checkMouse()
+            if clickPoint is not None and gameboard.click_at(win, clickPoint):
+                if remote is not None:
+                    remote.send_move(gameboard.state.last_move()[0])
+                gameboard.check_square(win, 'red')
+
+        #on a server the other player's lines are drawn as they come in
+        elif remote is not None:
+            win.checkMouse()
+            if remote.moves:
+                j, i = gameboard.state.edge_coords(remote.moves.pop(0))
+                gameboard.draw(win, j, i)
+                gameboard.check_square(win, 'blue')
 
-        #when gameboard.move = 1 it is the computer's turn
-        if gameboard.move == 1:
-            find_move(gameboard, win)
-            gameboard.check_square(win, 'blue')
-        time.sleep(0.2)
+        #when gameboard.move = 1 it is the computer's turn, the move is worked out in the background
+        else:
+            if computer is None:
+                computer = ComputerMove(gameboard.state, args.ai, args.think, rng, args.playouts)
+            elif key in ('space', 'Return'):
+                computer.move_now()
+            #clicks made while the computer thinks are thrown away
+            win.checkMouse()
+            if computer.done():
+                find_move(gameboard, win, computer)
+                gameboard.check_square(win, 'blue')
+                computer = None
 
-        #checks if the game is finished
+        #checks if the game is finished, on a server it ends early when a player runs out of time
         gameboard.game_finished()
+        if remote is not None and not remote.moves:
+            if remote.match.reason not in (None, 'over'):
+                print("The game was stopped:", "out of time" if remote.match.reason == 'time' else "a player left",
+                      "- you", "win" if remote.match.winner == remote.match.player else "lose")
+                gameboard.game_complete = True
         if gameboard.game_complete == True:
-            display_result(win, gameboard, winHeight, winWidth)
+            if remote is not None:
+                remote.close()
+            if args.record:
+                with records.RecordWriter(args.record) as writer:
+                    writer.write(rows // 2, columns // 2, args.seed, gameboard.state.moves())
+            display_result(win, gameboard, winHeight, winWidth, 'computer' if remote is None else 'opponent')
             win.getMouse()
             break
 
+        #keeps the window drawing and answering at about 30 frames a second
+        update(30)
+
+    if computer is not None:
+        computer.cancel()
+    if remote is not None:
+        remote.close()
+
 
 if __name__ == '__main__':
     main()
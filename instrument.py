@@ -0,0 +1,197 @@
+'''
+    instrument.py
+    Counts the calls to the parts of the computer players and adds up the time spent in
+    them, along with the positions the searches visit, to see where the time of a slow
+    move goes. Nothing is counted until enable() is called. It swaps the functions listed
+    in PHASES for wrappers that time every call, and disable() puts the originals back, so
+    a game without it runs the plain functions and pays nothing.
+        import instrument
+        instrument.enable()
+        ...play some moves...
+        print(json.dumps(instrument.report(), indent=2))
+
+    The time of a phase includes the phases it calls, so ai.find_move holds the time of
+    ai.classify_moves and the others. tournament.py --profile collects the counts from
+    every worker process and writes them as JSON.
+'''
+import functools
+import importlib
+import json
+import time
+
+
+#the functions and methods that are timed, as module and name
+PHASES = (
+    ('players', 'find_move'),
+    ('book', 'lookup'),
+    ('ai', 'find_move'),
+    ('ai', 'classify_moves'),
+    ('ai', 'take_all'),
+    ('ai', 'double_cross_check'),
+    ('ai', 'double_cross_play'),
+    ('ai', 'forced_move'),
+    ('endgame', 'find_move'),
+    ('endgame', 'value'),
+    ('chains', 'ChainAnalyzer.sync'),
+    ('chains', 'ChainAnalyzer.rebuild'),
+    ('search', 'AlphaBeta.find_move'),
+    ('search', 'evaluate'),
+    ('mcts', 'MCTS.search'),
+    ('mcts', 'untried_moves'),
+)
+
+#searches that count the positions they visit, as module, method and the attribute
+#holding the count for the last search
+NODES = (
+    ('search', 'AlphaBeta.find_move', 'nodes'),
+    ('mcts', 'MCTS.search', 'playouts'),
+)
+
+active = False
+#[calls, seconds, longest call, inside a call] by phase name
+_phases = {}
+#positions visited by search name
+_nodes = {}
+#(owner, attribute, original) for everything that was swapped
+_originals = []
+
+
+def timed(name, function):
+    entry = _phases.setdefault(name, [0, 0.0, 0.0, 0])
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        entry[0] += 1
+        #a function that calls itself is only timed for the outermost call
+        if entry[3]:
+            return function(*args, **kwargs)
+        entry[3] = 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            spent = time.perf_counter() - start
+            entry[3] = 0
+            entry[1] += spent
+            if spent > entry[2]:
+                entry[2] = spent
+    return wrapper
+
+
+def counted(name, function, attribute):
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            _nodes[name] = _nodes.get(name, 0) + getattr(self, attribute)
+    return wrapper
+
+
+def find_owner(module_name, path):
+    #the module or class that holds the function and the function's name in it
+    owner = importlib.import_module(module_name)
+    names = path.split('.')
+    for name in names[:-1]:
+        owner = getattr(owner, name)
+    return owner, names[-1]
+
+
+def enable():
+    '''Starts counting. The wrappers are put in place of the module functions and methods,
+        so callers that look them up on the module or class get the timed ones.
+    '''
+    global active
+    if active:
+        return
+    nodes = {(module_name, path): attribute for module_name, path, attribute in NODES}
+    for module_name, path in PHASES:
+        owner, name = find_owner(module_name, path)
+        original = getattr(owner, name)
+        full_name = module_name + '.' + path
+        wrapper = timed(full_name, original)
+        if (module_name, path) in nodes:
+            wrapper = counted(full_name, wrapper, nodes[(module_name, path)])
+        _originals.append((owner, name, original))
+        setattr(owner, name, wrapper)
+    active = True
+
+
+def disable():
+    #puts the original functions back, the counts are kept until reset
+    global active
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+    active = False
+
+
+def reset():
+    for entry in _phases.values():
+        entry[:3] = [0, 0.0, 0.0]
+    _nodes.clear()
+
+
+def report():
+    '''Returns the counts so far as a dictionary that can be written as JSON: calls, total
+        seconds and the longest call for every phase that was called, and positions visited
+        by every search.
+    '''
+    phases = {}
+    for name, (calls, seconds, longest, inside) in sorted(_phases.items()):
+        if calls:
+            phases[name] = {'calls': calls, 'seconds': seconds, 'max': longest}
+    return {'phases': phases, 'nodes': dict(sorted(_nodes.items()))}
+
+
+def take():
+    #the counts so far, starting again from nothing
+    found = report()
+    reset()
+    return found
+
+
+def merge(total, found):
+    '''Adds one report to another, for counts collected in different processes. total is
+        changed and returned.
+    '''
+    phases = total.setdefault('phases', {})
+    for name, counts in found['phases'].items():
+        if name not in phases:
+            phases[name] = dict(counts)
+        else:
+            phases[name]['calls'] += counts['calls']
+            phases[name]['seconds'] += counts['seconds']
+            phases[name]['max'] = max(phases[name]['max'], counts['max'])
+    nodes = total.setdefault('nodes', {})
+    for name, count in found['nodes'].items():
+        nodes[name] = nodes.get(name, 0) + count
+    return total
+
+
+def dump(path, found=None):
+    #writes a report, the counts so far by default, to a JSON file
+    with open(path, 'w') as out:
+        json.dump(found if found is not None else report(), out, indent=2)
+
+
+def testModule(): #times a few games of each player and shows where the time went
+    import random
+    import players
+    from state import GameState
+
+    enable()
+    rng = random.Random(0)
+    for strategy in ('heuristic', 'alphabeta', 'mcts'):
+        state = GameState(4, 4)
+        while not state.game_over():
+            state.play(players.find_move(state, strategy, 0.05, rng))
+    found = take()
+    disable()
+    assert not hasattr(players.find_move, '__wrapped__')
+    for name, counts in sorted(found['phases'].items(), key=lambda item: -item[1]['seconds']):
+        print('%-26s %7d calls %8.3f s' % (name, counts['calls'], counts['seconds']))
+    for name, count in found['nodes'].items():
+        print('%-26s %7d nodes' % (name, count))
+
+if __name__ == '__main__':
+    testModule()
@@ -0,0 +1,251 @@
+'''
+    mcts.py
+    A Monte Carlo tree search (UCT) computer player. Every playout walks down the tree
+    of moves tried so far, adds one new move to it and then plays the game out to the end
+    with the policy of the heuristic player: take a box when one can be taken, otherwise
+    draw an edge that does not give a box away, otherwise the edge that gives the fewest
+    boxes away. Once only chains and loops are left the playout follows endgame.py
+    instead. The tree only grows edges that give boxes away when no other edge is left,
+    so the playouts are not spread over moves that hand the game over. The move played
+    most often from the top of the tree is picked.
+
+    The tree is kept between moves, so the playouts spent on the reply that was actually
+    played are used again. On machines with more cores, find_move_parallel runs separate
+    trees in a pool of processes and adds up how often each move was played.
+'''
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import time
+
+import ai
+import endgame
+from state import GameState
+
+
+def rollout_move(state, rng):
+    '''The quick policy used to play games out: take a box, else a safe edge, choosing
+        at random among equal edges, else the edge that gives the fewest boxes away, as
+        the heuristic player does. The endgame is played exactly.
+    '''
+    if endgame.is_simple(state):
+        return endgame.find_move(state)
+    noNeighbors, oneNeighbors, twoNeighbors, captures = ai.classify_moves(state)
+    for moves in (captures, noNeighbors + oneNeighbors):
+        if moves:
+            return moves[rng.randint(0, len(moves) - 1)]
+    return ai.forced_move(state, twoNeighbors)
+
+
+def play_out(state, rng):
+    '''Plays the game to the end with rollout_move. An edge that gives a box away never
+        becomes safe again while more edges are drawn, so once there is no box to take the
+        safe edges are drawn in one pass over the undrawn edges in a random order, which
+        picks at random among the safe edges left just as rollout_move does, without
+        sorting all the edges again for every move.
+    '''
+    while not state.game_over() and (endgame.is_simple(state) or ai.classify_moves(state)[3]):
+        state.play(rollout_move(state, rng))
+    moves = state.legal_moves()
+    rng.shuffle(moves)
+    for edge in moves:
+        if not state.drawn[edge] and ai.neighbor_count(state, edge) < 2:
+            state.play(edge)
+    while not state.game_over():
+        state.play(rollout_move(state, rng))
+
+
+class Node:
+
+    __slots__ = ('edge', 'parent', 'player', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, edge, parent, player, untried):
+        #the edge that was played to get here and the player who played it
+        self.edge = edge
+        self.parent = parent
+        self.player = player
+        self.children = {}
+        #moves not added to the tree yet, the last one is added first
+        self.untried = untried
+        self.visits = 0
+        #games won from here by the player who played the edge, draws count as half
+        self.wins = 0.0
+
+
+def untried_moves(state):
+    '''The moves a node of the tree can grow. Once only chains and loops are left that is
+        the exact move of endgame.py. When boxes can be taken it is those and the move of
+        the heuristic player, which can be a double-cross. Otherwise it is the safe edges,
+        and edges that give boxes away only when nothing else is left, the fewest first.
+    '''
+    if endgame.is_simple(state):
+        return [endgame.find_move(state)]
+    noNeighbors, oneNeighbors, twoNeighbors, captures = ai.classify_moves(state)
+    if captures:
+        #the heuristic player may hand boxes back with a double-cross instead
+        move = ai.find_move(state)
+        return captures if move in captures else captures + [move]
+    if noNeighbors or oneNeighbors:
+        return oneNeighbors + noNeighbors
+    counts = ai.sacrifices(state)
+    return sorted(twoNeighbors, key=counts.count, reverse=True)
+
+
+class MCTS:
+
+    def __init__(self, exploration=1.4, rng=None, rollout=play_out):
+        self.exploration = exploration
+        self.rng = ai.get_rng(rng)
+        self.rollout = rollout
+        self.root = None
+        #the board size and the moves of the game up to the root of the tree
+        self.root_size = None
+        self.root_moves = None
+        #the number of playouts run by the last search
+        self.playouts = 0
+
+    def find_move(self, state, playouts=None, time_limit=1.0, stop=None):
+        '''Runs playouts until the given number is reached or the time is up, and returns
+            the move tried most often. stop, if given, is a threading.Event that ends the
+            search early. The state is left as it was.
+        '''
+        self.search(state, playouts, time_limit, stop)
+        return max(self.root.children.values(), key=lambda child: child.visits).edge
+
+    def search(self, state, playouts=None, time_limit=1.0, stop=None):
+        state = state.copy()
+        self.reuse(state)
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.playouts = 0
+        while True:
+            self.playout(state)
+            self.playouts += 1
+            if playouts is not None and self.playouts >= playouts:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if stop is not None and stop.is_set():
+                break
+        return self.root
+
+    def reuse(self, state):
+        '''Moves the root of the tree down to the position of the state if the tree was
+            built for an earlier position of the same game, otherwise starts a new tree.
+            Games on other board sizes can start with the same edge numbers, so the size
+            has to match too.
+        '''
+        moves = state.moves()
+        size = (state.rows, state.columns)
+        node = None
+        if (self.root is not None and size == self.root_size and
+                moves[:len(self.root_moves)] == self.root_moves):
+            node = self.root
+            for edge in moves[len(self.root_moves):]:
+                node = node.children.get(edge)
+                if node is None:
+                    break
+        if node is None:
+            node = Node(None, None, None, untried_moves(state))
+        node.parent = None
+        self.root = node
+        self.root_size = size
+        self.root_moves = moves
+
+    def playout(self, state):
+        depth = len(state.history)
+        node = self.root
+        #walks down while every move of the node has been tried
+        while not node.untried and node.children:
+            node = self.select(node)
+            state.play(node.edge)
+        if node.untried:
+            edge = node.untried.pop()
+            player = state.player
+            state.play(edge)
+            child = Node(edge, node, player, untried_moves(state))
+            node.children[edge] = child
+            node = child
+        self.rollout(state, self.rng)
+        score = state.score
+        while node is not None:
+            node.visits += 1
+            if node.player is not None:
+                mine = score[node.player]
+                theirs = score[1 - node.player]
+                node.wins += 1.0 if mine > theirs else 0.5 if mine == theirs else 0.0
+            node = node.parent
+        ai.rewind(state, depth)
+
+    def select(self, node):
+        #the child with the best upper confidence bound
+        log_visits = math.log(node.visits)
+        best = None
+        best_value = -1.0
+        for child in node.children.values():
+            value = child.wins / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best_value = value
+                best = child
+        return best
+
+    def visit_counts(self):
+        #how often each move from the root was played
+        return {edge: child.visits for edge, child in self.root.children.items()}
+
+
+_tree = None
+
+def reset():
+    #starts the next search in this process with a new tree
+    global _tree
+    _tree = None
+
+
+def find_move(state, time_limit=1.0, playouts=None, rng=None, stop=None):
+    '''Finds a move with one tree in this process. The tree is kept for the next move.'''
+    global _tree
+    if _tree is None:
+        _tree = MCTS(rng=rng)
+    elif rng is not None:
+        _tree.rng = ai.get_rng(rng)
+    return _tree.find_move(state, playouts, time_limit, stop)
+
+
+def search_worker(rows, columns, moves, playouts, time_limit, seed):
+    #runs in a worker process, each worker keeps its own tree between moves
+    global _tree
+    state = GameState.from_moves(rows, columns, moves)
+    if _tree is None:
+        _tree = MCTS()
+    _tree.rng = ai.get_rng(seed)
+    _tree.search(state, playouts, time_limit)
+    return _tree.visit_counts()
+
+
+_pool = None
+#the number of processes in _pool
+_pool_workers = None
+
+def find_move_parallel(state, time_limit=1.0, playouts=None, rng=None, workers=None):
+    '''Finds a move with a separate tree in every worker process (root parallel search).
+        The visit counts of the moves are added up over the trees and the move played
+        most often is picked. playouts, if given, is the number for each worker. The pool
+        is kept between moves, and made again when it is asked for another number of
+        workers.
+    '''
+    global _pool, _pool_workers
+    workers = workers or os.cpu_count() or 1
+    if _pool is None or workers != _pool_workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    rng = ai.get_rng(rng)
+    moves = state.moves()
+    futures = [_pool.submit(search_worker, state.rows, state.columns, moves, playouts, time_limit,
+                            rng.randrange(1 << 31)) for worker in range(workers)]
+    totals = {}
+    for future in futures:
+        for edge, visits in future.result().items():
+            totals[edge] = totals.get(edge, 0) + visits
+    return max(sorted(totals), key=lambda edge: totals[edge])
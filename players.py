@@ -0,0 +1,61 @@
+'''
+    players.py
+    The computer players that can be picked for a game, by name. The heuristic player
+    in ai.py is quick. The alpha-beta player in search.py and the Monte Carlo tree search
+    players in mcts.py get stronger the more time they are given; mcts_parallel uses a
+    process for every core.
+
+    Every player first looks the position up in the book of solved positions for the
+    board size (see book.py), and only works out a move itself when it is not there.
+'''
+import ai
+import book
+import mcts
+import search
+
+
+#every player is called with the state, the seconds to think, the random number generator,
+#the stop event and the number of playouts for the players in mcts.py, which think for a
+#fixed number of playouts instead of a time when it is not None
+STRATEGIES = {
+    'heuristic': lambda state, think_time, rng, stop, playouts: ai.find_move(state, rng),
+    'alphabeta': lambda state, think_time, rng, stop, playouts: search.find_move(state, think_time, stop=stop),
+    'mcts': lambda state, think_time, rng, stop, playouts: mcts.find_move(
+        state, None if playouts else think_time, playouts, rng=rng, stop=stop),
+    'mcts_parallel': lambda state, think_time, rng, stop, playouts: mcts.find_move_parallel(
+        state, None if playouts else think_time, playouts, rng=rng),
+}
+
+#players that start their own pool of processes, so they can not play inside one
+POOL_STRATEGIES = ('mcts_parallel',)
+
+
+def pool_strategies():
+    #the names of the players that can move inside a pool of processes, sorted
+    return sorted(name for name in STRATEGIES if name not in POOL_STRATEGIES)
+
+
+def find_move(state, strategy='heuristic', think_time=1.0, rng=None, stop=None, use_book=True, playouts=None):
+    '''Returns the move the named computer player picks for the state.
+        think_time is the number of seconds a searching player may use. rng is a
+        random.Random or a seed for players that pick between equal moves at random;
+        every player of a game should get its own generator, kept for the whole game,
+        so the game can be played again. stop is a threading.Event; searching players
+        return their best move so far once it is set. use_book=False makes the player
+        work out every move itself. playouts, if given, makes the mcts players run that
+        many playouts (in every worker for mcts_parallel) instead of thinking for
+        think_time, so mcts picks the same moves every time it is given the same rng.
+    '''
+    if strategy not in STRATEGIES:
+        raise ValueError("unknown strategy %r, pick one of %s" % (strategy, ', '.join(sorted(STRATEGIES))))
+    if use_book:
+        move = book.find_move(state)
+        if move is not None:
+            return move
+    return STRATEGIES[strategy](state, think_time, ai.get_rng(rng), stop, playouts)
+
+
+def new_game():
+    #forgets what the players kept from earlier games, like the tree of mcts.py, so a game
+    #is played the same way whichever games this process played before
+    mcts.reset()
@@ -0,0 +1,218 @@
+'''
+    records.py
+    A compact binary format for finished games, used to keep games played in game1.py and
+    tournament.py. A record holds the board size, the seed of the game and its moves as
+    edge numbers (see state.py), so a game can be played again with GameState.from_moves.
+
+    Every number is written as a varint: seven bits to a byte with the lowest bits first,
+    and the top bit of a byte is set when another byte follows. Numbers below 128 take one
+    byte, so a move takes one byte on boards up to about 7x8 and two bytes on bigger ones.
+    A record is its rows, columns, seed and number of moves followed by the moves, and a
+    file is MAGIC followed by records one after the other. Records are only ever added to
+    the end of a file.
+
+    A record can be found again by its offset, the byte position where it starts in the
+    file. RecordWriter.write returns it and RecordFile.offsets lists them all.
+'''
+import mmap
+import os
+
+
+MAGIC = b'DBG1'
+
+
+class Record:
+
+    __slots__ = ('rows', 'columns', 'seed', 'moves')
+
+    def __init__(self, rows, columns, seed, moves):
+        self.rows = rows
+        self.columns = columns
+        self.seed = seed
+        self.moves = moves
+
+    def __eq__(self, other):
+        return (isinstance(other, Record) and (self.rows, self.columns, self.seed, self.moves) ==
+                (other.rows, other.columns, other.seed, other.moves))
+
+    def __repr__(self):
+        return 'Record(%d, %d, %d, %d moves)' % (self.rows, self.columns, self.seed, len(self.moves))
+
+
+def write_varint(out, value):
+    #adds a number that is 0 or more to a bytearray
+    if value < 0:
+        raise ValueError('varints can not be negative: %d' % value)
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    '''Returns the number at the offset in data and the offset just after it. Raises
+        IndexError when data ends in the middle of the number.
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode(rows, columns, seed, moves):
+    #the bytes of one record
+    out = bytearray()
+    for value in (rows, columns, seed, len(moves)):
+        write_varint(out, value)
+    for edge in moves:
+        write_varint(out, edge)
+    return bytes(out)
+
+
+def decode(data, offset):
+    '''Returns the record starting at the offset in data and the offset of the next one.
+        Raises IndexError when data ends in the middle of the record.
+    '''
+    rows, offset = read_varint(data, offset)
+    columns, offset = read_varint(data, offset)
+    seed, offset = read_varint(data, offset)
+    count, offset = read_varint(data, offset)
+    moves = []
+    for index in range(count):
+        edge, offset = read_varint(data, offset)
+        moves.append(edge)
+    return Record(rows, columns, seed, moves), offset
+
+
+class RecordWriter:
+    '''Adds records to the end of a file, starting the file if it does not exist yet. Each
+        record is written in one piece, so a file being written can be read at the same
+        time up to its last whole record.
+    '''
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+            self.file.flush()
+
+    def write(self, rows, columns, seed, moves):
+        #returns the offset of the record in the file
+        offset = self.file.tell()
+        self.file.write(encode(rows, columns, seed, moves))
+        self.file.flush()
+        return offset
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.close()
+
+
+def read_records(path, chunk_size=1 << 16):
+    '''Yields the records of a file one at a time. The file is read a chunk at a time, so
+        files with millions of games do not have to fit in memory. A record cut off at the
+        end of the file, by a writer that is still busy or was stopped, is left out.
+    '''
+    with open(path, 'rb') as records:
+        if records.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a game record file' % path)
+        data = b''
+        offset = 0
+        more = True
+        while more:
+            chunk = records.read(chunk_size)
+            more = bool(chunk)
+            data = data[offset:] + chunk
+            offset = 0
+            while offset < len(data):
+                try:
+                    record, offset = decode(data, offset)
+                except IndexError:
+                    #the rest of the record is in the next chunk
+                    break
+                yield record
+
+
+class RecordFile:
+    '''Reads records anywhere in a file by their offset without reading the whole file.
+        The file is memory mapped, so only the pages that are looked at are loaded.
+    '''
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('%s is not a game record file' % path)
+
+    def read(self, offset):
+        if not len(MAGIC) <= offset < len(self.data):
+            raise IndexError('no record at offset %d' % offset)
+        return decode(self.data, offset)[0]
+
+    def offsets(self):
+        #the offset of every whole record in the file
+        offset = len(MAGIC)
+        while offset < len(self.data):
+            try:
+                record, following = decode(self.data, offset)
+            except IndexError:
+                return
+            yield offset
+            offset = following
+
+    def __iter__(self):
+        for offset in self.offsets():
+            yield self.read(offset)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.close()
+
+
+def testModule(): #writes random games, reads them back both ways and shows the size
+    import random
+    import tempfile
+    from state import GameState
+
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(), 'test.rec')
+    games = []
+    offsets = []
+    with RecordWriter(path) as writer:
+        for seed in range(1000):
+            rows, columns = rng.choice([(2, 2), (3, 3), (5, 5), (12, 25)])
+            moves = list(range(GameState(rows, columns).num_edges))
+            rng.shuffle(moves)
+            games.append(Record(rows, columns, seed, moves))
+            offsets.append(writer.write(rows, columns, seed, moves))
+
+    assert list(read_records(path, chunk_size=100)) == games
+    with RecordFile(path) as records:
+        assert list(records.offsets()) == offsets
+        for index in rng.sample(range(len(games)), 50):
+            assert records.read(offsets[index]) == games[index]
+
+    moves = sum(len(game.moves) for game in games)
+    print('%d games with %d moves in %d bytes, %.2f bytes a move'
+          % (len(games), moves, os.path.getsize(path), os.path.getsize(path) / moves))
+    os.remove(path)
+
+if __name__ == '__main__':
+    testModule()
@@ -0,0 +1,212 @@
+'''
+    search.py
+    A stronger and slower computer player. It runs an iterative deepening alpha-beta
+    (negamax) search on a GameState until its time runs out. Closing a box gives the
+    same player another move, so the value of a move that closes boxes is those boxes plus
+    the value of the position for the same player, otherwise it is minus the value for
+    the opponent. Values are always the boxes still to be won by the player to move
+    minus the boxes still to be won by the other player.
+
+    Searched positions are kept in a transposition table keyed by the canonical key of the
+    state (see symmetry.py), so positions reached by different move orders, and mirror
+    images and turns of a position, are only searched once.
+'''
+import time
+
+import ai
+
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class Timeout(Exception):
+    #raised inside the search when the time for a move is up
+    pass
+
+
+class TranspositionTable:
+    '''A table of searched positions with a fixed number of slots. A key always goes to
+        the same slot. When two positions want the same slot the entry from the deeper
+        search is kept, unless the entry in the slot is left over from an earlier move.
+    '''
+
+    def __init__(self, size=1 << 18):
+        self.size = size
+        self.slots = [None] * size
+        #bumped for every move so entries from earlier moves can be replaced
+        self.generation = 0
+
+    def get(self, key):
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key, depth, value, flag, move):
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.slots[index] = (key, depth, value, flag, move, self.generation)
+
+    def __len__(self):
+        return sum(1 for entry in self.slots if entry is not None)
+
+
+class AlphaBeta:
+
+    def __init__(self, table=None, symmetric=True):
+        self.table = table if table is not None else TranspositionTable()
+        #keys the table on canonical keys, otherwise on the plain zobrist key
+        self.symmetric = symmetric
+        #the number of positions visited by the last search
+        self.nodes = 0
+        self.deadline = None
+        self.stop = None
+
+    def find_move(self, state, time_limit=1.0, max_depth=None, stop=None):
+        '''Searches one more move deeper each time until the time is up or the game is
+            searched to the end, and returns the best move of the deepest finished search.
+            stop, if given, is a threading.Event that ends the search early in the same way.
+            The state is played and taken back during the search but is left as it was.
+        '''
+        state = state.copy()
+        self.table.generation += 1
+        self.nodes = 0
+        self.deadline = time.perf_counter() + time_limit
+        self.stop = stop
+        moves = self.order_moves(state, None)
+        best = moves[0]
+        if max_depth is None:
+            max_depth = len(moves)
+        for depth in range(1, max_depth + 1):
+            try:
+                value, move = self.root(state, depth, moves)
+            except Timeout:
+                break
+            best = move
+            #the best move is searched first in the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+            if depth >= len(moves):
+                break
+        return best
+
+    def values(self, state, depth):
+        '''Returns the value of every undrawn edge of the state, searched depth moves deep
+            without a time limit, as (move, value) in the order the search tries them.
+            Every move gets its own full window, so the values are exact to that depth and
+            not only good enough to pick the best one.
+        '''
+        state = state.copy()
+        self.table.generation += 1
+        self.nodes = 0
+        self.deadline = float('inf')
+        self.stop = None
+        alpha = -state.num_boxes - 1
+        beta = state.num_boxes + 1
+        return [(move, self.child(state, move, depth, alpha, beta)) for move in self.order_moves(state, None)]
+
+    def root(self, state, depth, moves):
+        alpha = -state.num_boxes - 1
+        beta = state.num_boxes + 1
+        best = moves[0]
+        for move in moves:
+            value = self.child(state, move, depth, alpha, beta)
+            if value > alpha:
+                alpha = value
+                best = move
+        return alpha, best
+
+    def child(self, state, move, depth, alpha, beta):
+        #plays a move, scores it for the player who played it and takes it back
+        closed = len(state.play(move))
+        if closed:
+            value = closed + self.negamax(state, depth - 1, alpha - closed, beta - closed)
+        else:
+            value = -self.negamax(state, depth - 1, -beta, -alpha)
+        state.undo()
+        return value
+
+    def negamax(self, state, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and (time.perf_counter() > self.deadline or
+                                       self.stop is not None and self.stop.is_set()):
+            raise Timeout()
+        if state.remaining == 0:
+            return 0
+        if depth <= 0:
+            return evaluate(state)
+
+        if self.symmetric:
+            key, k = state.canonical()
+        else:
+            key, k = state.hash, 0
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            #the move was stored for the canonical position, so it is turned back
+            hint = state.inverses[k][entry[4]]
+            if entry[1] >= depth:
+                if entry[3] == EXACT:
+                    return entry[2]
+                if entry[3] == LOWER and entry[2] >= beta:
+                    return entry[2]
+                if entry[3] == UPPER and entry[2] <= alpha:
+                    return entry[2]
+
+        start = alpha
+        best = -state.num_boxes - 1
+        best_move = None
+        for move in self.order_moves(state, hint):
+            value = self.child(state, move, depth, alpha, beta)
+            if value > best:
+                best = value
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best <= start:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.put(key, depth, best, flag, state.permutations[k][best_move])
+        return best
+
+    def order_moves(self, state, hint):
+        '''Returns the undrawn edges with the best move from the table first, then the
+            edges that close a box, then the edges that do not give a box away and last
+            the edges that do.
+        '''
+        noNeighbors, oneNeighbors, twoNeighbors, captures = ai.classify_moves(state)
+        moves = captures + noNeighbors + oneNeighbors + twoNeighbors
+        if hint is not None and hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        return moves
+
+
+def evaluate(state):
+    '''Scores a position at the end of the search depth by the boxes the player to move
+        can take right away.
+    '''
+    depth = len(state.history)
+    boxes = [box for box in range(state.num_boxes) if state.sides[box] == 3]
+    numComplete = ai.take_all(state, boxes)
+    ai.rewind(state, depth)
+    return numComplete
+
+
+_searcher = None
+
+def find_move(state, time_limit=1.0, max_depth=None, stop=None):
+    '''Finds a move with alpha-beta search. The transposition table is kept between calls.'''
+    global _searcher
+    if _searcher is None:
+        _searcher = AlphaBeta()
+    return _searcher.find_move(state, time_limit, max_depth, stop)
@@ -0,0 +1,481 @@
+'''
+    server.py
+    A match server that hosts many games at once over TCP or a Unix socket. Players are
+    programs that connect to it: bots, the Tk game (python game1.py --server HOST:PORT) or
+    the computer players of client.py. A player can also ask for a game against one of the
+    computer players, which then moves on the server.
+        python server.py --port 7878
+    python server.py --test plays a few hundred games at once over localhost.
+        python client.py localhost:7878 --size 3x3 --ai heuristic --games 10
+
+    The protocol is lines of words. A player sends
+        PLAY <rows>x<columns> [<seconds per move> [<computer player>]]
+        MOVE <edge>
+        QUIT
+    and the server answers with
+        WAIT                              no one to play yet, the game starts when someone is
+        START <rows> <columns> <you> <seconds>
+        TURN                              your move, within the seconds of the time control
+        MOVED <player> <edge>             after every move, your own ones too
+        END <score 0> <score 1> <winner> <reason>
+        ERROR <message>
+    Edges are numbered as in state.py and the players are 0, who moves first, and 1. Two
+    players asking for the same board and time control play each other, the one that asked
+    first moving first. A player that asks for a computer player moves first against it.
+
+    The winner is 0, 1 or -1 for a tie. A player that does not move in time or goes away
+    loses the game, which ends with the reason time or gone and the score so far.
+    Otherwise the reason is over and the winner has the most boxes. An illegal move
+    is answered with an ERROR and the clock keeps running. A MOVE sent when it is not the
+    player's turn, or after a move was already sent for this TURN, is answered with an
+    ERROR and thrown away. After END the player can ask
+    for another game on the same connection.
+
+    The computer players run in a pool of processes, so their thinking does not hold up
+    the other games. They think for half of the time control, or --playouts gives the mcts
+    player a fixed number of playouts a move, which loses on time if it is too many for
+    the time control. There are only as many
+    games against a computer player at a time as there are processes, so a move never
+    waits in the pool behind other games; a player asking for one when they are all taken
+    gets WAIT and the game starts when one finishes.
+'''
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import time
+
+import players
+from state import GameState
+
+
+PORT = 7878
+#the biggest board that can be asked for, in boxes: 12x25, the biggest board bench.py
+#times the computer players on and the biggest one that fits the window of game1.py
+MAX_BOXES = 300
+#the seconds per move when PLAY does not say
+SECONDS = 10.0
+#the computer players move in a pool of processes
+COMPUTER_STRATEGIES = players.pool_strategies()
+
+
+class Gone(Exception):
+    pass
+
+
+class Client:
+    '''A player connected to the server. The lines it sends are read by the server's
+        connection handler, which hands moves to the game through a queue.
+    '''
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.moves = asyncio.Queue()
+        self.game = None
+        #set from TURN until a move is sent, only then is a move passed on to the game
+        self.turn = False
+        self.closed = False
+
+    def send(self, line):
+        if not self.closed:
+            self.writer.write((line + '\n').encode())
+
+    def clear(self):
+        #throws away moves that were sent before they were asked for
+        while not self.moves.empty():
+            if self.moves.get_nowait() is None:
+                self.moves.put_nowait(None)
+                return
+
+    async def find_move(self, state, seconds):
+        #waits for a legal move, the game's time control is kept by the caller
+        self.clear()
+        self.turn = True
+        self.send('TURN')
+        try:
+            return await self.next_move(state)
+        finally:
+            self.turn = False
+
+    async def next_move(self, state):
+        while True:
+            words = await self.moves.get()
+            if words is None:
+                raise Gone()
+            try:
+                edge = int(words[0])
+            except (IndexError, ValueError):
+                self.send('ERROR MOVE needs an edge number')
+                self.turn = True
+                continue
+            if not 0 <= edge < state.num_edges or state.is_drawn(edge):
+                self.send('ERROR illegal move %d' % edge)
+                self.turn = True
+                continue
+            return edge
+
+
+class Computer:
+    '''A computer player of players.py, moving in the server's process pool. A move that
+        is not found in time can not be stopped in its process, so job is kept until it
+        ends and idle() waits for that before the process is handed to another game.
+    '''
+
+    def __init__(self, strategy, pool, seed, playouts=None):
+        self.strategy = strategy
+        self.pool = pool
+        #the fixed number of playouts of an mcts player, see players.find_move
+        self.playouts = playouts
+        self.rng = random.Random(seed)
+        self.game = None
+        #the move being worked out in the pool, or the last one
+        self.job = None
+
+    def send(self, line):
+        pass
+
+    def clear(self):
+        pass
+
+    async def find_move(self, state, seconds):
+        self.job = self.pool.submit(computer_move, state.rows, state.columns, state.moves(),
+                                    self.strategy, seconds / 2, self.rng.randrange(1 << 31), time.time(),
+                                    self.playouts)
+        #when the game gives up waiting, a move still queued in the pool is cancelled
+        return await asyncio.wrap_future(self.job)
+
+    async def idle(self):
+        if self.job is not None and not self.job.done():
+            await asyncio.wait([asyncio.wrap_future(self.job)])
+
+
+def computer_move(rows, columns, moves, strategy, think_time, seed, sent, playouts=None):
+    '''Runs in a pool process, where the searching players keep their tables between
+        moves. The time the move waited to be started is taken off the time to think, so
+        the player still answers within the time control.
+    '''
+    think_time = max(think_time / 10, think_time - (time.time() - sent))
+    return players.find_move(GameState.from_moves(rows, columns, moves), strategy, think_time, seed,
+                             playouts=playouts)
+
+
+def parse_play(words):
+    '''Returns the board size, the seconds per move and the computer player asked for by
+        the words after PLAY. Raises ValueError with a message for the player.
+    '''
+    if not 1 <= len(words) <= 3:
+        raise ValueError('PLAY needs a size like 3x3, seconds per move and a computer player')
+    try:
+        rows, columns = (int(number) for number in words[0].lower().split('x'))
+        seconds = float(words[1]) if len(words) > 1 else SECONDS
+    except ValueError:
+        raise ValueError('PLAY needs a size like 3x3 and seconds per move')
+    if rows < 1 or columns < 1 or rows * columns > MAX_BOXES:
+        raise ValueError('boards go from 1x1 to %d boxes' % MAX_BOXES)
+    if not seconds > 0:
+        raise ValueError('the seconds per move must be more than 0')
+    strategy = words[2] if len(words) > 2 else None
+    if strategy is not None and strategy not in COMPUTER_STRATEGIES:
+        raise ValueError('unknown computer player %s, pick one of %s' % (strategy, ' '.join(COMPUTER_STRATEGIES)))
+    return rows, columns, seconds, strategy
+
+
+class MatchServer:
+    '''Pairs up the players that connect and runs their games. start() opens the socket,
+        on a port or, when path is given, as a Unix socket. port=0 picks a free port, see
+        address().
+    '''
+
+    def __init__(self, host='localhost', port=PORT, path=None, workers=None, seed=0, playouts=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        #the playouts of the mcts player for every move instead of half the time control
+        self.playouts = playouts
+        self.rng = random.Random(seed)
+        self.server = None
+        self.pool = None
+        #a place in the pool for every game against a computer player
+        self.computer_slots = None
+        #the player waiting for an opponent, by board size and seconds per move
+        self.waiting = {}
+        self.games = set()
+        #the connection handlers that are running
+        self.connections = set()
+        #the number of games finished, by reason
+        self.finished = {}
+
+    async def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.computer_slots = asyncio.Semaphore(self.workers)
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        return self
+
+    def address(self):
+        if self.path is not None:
+            return self.path
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for game in list(self.games):
+            game.cancel()
+        if self.games:
+            await asyncio.wait(self.games)
+        #closing the connections ends their handlers as if the players had gone
+        for client, task in list(self.connections):
+            client.writer.close()
+        if self.connections:
+            await asyncio.wait([task for client, task in self.connections])
+        self.pool.shutdown()
+
+    async def handle(self, reader, writer):
+        #reads the lines of one connection until it goes away
+        client = Client(writer)
+        connection = (client, asyncio.current_task())
+        self.connections.add(connection)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ConnectionError:
+                    break
+                except ValueError:
+                    #a line over the stream limit, what was read of it is thrown away
+                    client.send('ERROR line too long')
+                    continue
+                if not line:
+                    break
+                words = line.decode(errors='replace').split()
+                if not words:
+                    continue
+                command = words[0].upper()
+                if command == 'QUIT':
+                    break
+                elif command == 'MOVE' and client.turn:
+                    client.turn = False
+                    client.moves.put_nowait(words[1:])
+                elif command == 'MOVE' and client.game is not None:
+                    client.send('ERROR not your turn')
+                elif command == 'PLAY' and client.game is None and client not in self.waiting.values():
+                    try:
+                        self.request(client, *parse_play(words[1:]))
+                    except ValueError as error:
+                        client.send('ERROR %s' % error)
+                else:
+                    client.send('ERROR unexpected %s' % command)
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    break
+        finally:
+            client.closed = True
+            client.moves.put_nowait(None)
+            for key, waiting in list(self.waiting.items()):
+                if waiting is client:
+                    del self.waiting[key]
+            writer.close()
+            self.connections.discard(connection)
+
+    def request(self, client, rows, columns, seconds, strategy):
+        if strategy is not None:
+            computer = Computer(strategy, self.pool, self.rng.randrange(1 << 31), self.playouts)
+            #the client can not ask for another game while it waits for a place in the pool
+            client.game = True
+            self.add_game(self.computer_game(client, computer, rows, columns, seconds))
+            return
+        key = (rows, columns, seconds)
+        first = self.waiting.pop(key, None)
+        if first is None:
+            self.waiting[key] = client
+            client.send('WAIT')
+        else:
+            self.start_game((first, client), rows, columns, seconds)
+
+    def start_game(self, seats, rows, columns, seconds):
+        for seat in seats:
+            seat.game = True
+            seat.clear()
+        self.add_game(self.play_game(seats, rows, columns, seconds))
+
+    def add_game(self, coroutine):
+        game = asyncio.ensure_future(coroutine)
+        self.games.add(game)
+        game.add_done_callback(self.games.discard)
+
+    async def computer_game(self, client, computer, rows, columns, seconds):
+        '''Plays a game against a computer player once there is a place in the pool for it.
+            The place is given up only when the computer's last move has ended in its
+            process, even if the game was lost on time before that.
+        '''
+        try:
+            if self.computer_slots.locked():
+                client.send('WAIT')
+            async with self.computer_slots:
+                if client.closed:
+                    return
+                for seat in (client, computer):
+                    seat.game = True
+                    seat.clear()
+                try:
+                    await self.play_game((client, computer), rows, columns, seconds)
+                finally:
+                    await computer.idle()
+        finally:
+            client.game = None
+
+    async def play_game(self, seats, rows, columns, seconds):
+        '''Plays one game between two seats, Clients or Computers, keeping the time control,
+            and tells both seats how it went.
+        '''
+        state = GameState(rows, columns)
+        for player, seat in enumerate(seats):
+            seat.send('START %d %d %d %s' % (rows, columns, player, seconds))
+        reason = 'over'
+        loser = None
+        try:
+            while not state.game_over():
+                player = state.player
+                try:
+                    edge = await asyncio.wait_for(seats[player].find_move(state, seconds), seconds)
+                except asyncio.TimeoutError:
+                    reason = 'time'
+                    loser = player
+                    break
+                except Gone:
+                    reason = 'gone'
+                    loser = player
+                    break
+                state.play(edge)
+                for seat in seats:
+                    seat.send('MOVED %d %d' % (player, edge))
+        finally:
+            score = state.score
+            if loser is not None:
+                #a player that leaves the game loses it whatever the score
+                winner = 1 - loser
+            elif score[0] != score[1]:
+                winner = 0 if score[0] > score[1] else 1
+            else:
+                winner = -1
+            for seat in seats:
+                seat.send('END %d %d %d %s' % (score[0], score[1], winner, reason))
+                seat.game = None
+            self.finished[reason] = self.finished.get(reason, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host dots and boxes games over the network.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', default=None, help='a path to listen on as a Unix socket instead')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes for the computer players, all cores by default')
+    parser.add_argument('--playouts', type=int, default=None,
+                        help='playouts per move for the mcts player instead of half the time control')
+    parser.add_argument('--test', action='store_true', help='play games against itself over localhost and stop')
+    args = parser.parse_args()
+    if args.test:
+        testModule()
+        return
+
+    async def serve():
+        server = await MatchServer(args.host, args.port, args.unix, args.workers, playouts=args.playouts).start()
+        print('serving on', server.address())
+        try:
+            await server.server.serve_forever()
+        finally:
+            await server.close()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def testModule(): #plays hundreds of games at once over localhost between bots and the computer
+    import time
+    import client
+
+    async def bot(address, size, seconds, strategy=None, slow=False):
+        reader, writer = await asyncio.open_connection(*address)
+        writer.write(('PLAY %s %s %s\n' % (size, seconds, strategy or '')).encode())
+        match = client.Match()
+        while match.reason is None:
+            line = await reader.readline()
+            if match.receive(line.decode().split()):
+                if slow:
+                    await asyncio.sleep(seconds * 2)
+                writer.write(('MOVE %d\n' % players.find_move(match.state)).encode())
+        writer.close()
+        await writer.wait_closed()
+        return match
+
+    async def run():
+        server = await MatchServer(port=0, workers=2).start()
+        address = server.address()
+        start = time.perf_counter()
+        bots = [bot(address, '3x3', 5.0) for number in range(400)]
+        bots += [bot(address, '5x5', 5.0, 'heuristic') for number in range(20)]
+        matches = await asyncio.gather(*bots)
+        seconds = time.perf_counter() - start
+        for match in matches:
+            assert match.state.game_over() and match.reason == 'over'
+            assert match.score == match.state.score
+        print('%d players finished %d games in %.1f seconds' % (len(matches), sum(server.finished.values()), seconds))
+        #more games against a searching player than there are processes, the ones that do
+        #not get a process wait for one instead of losing on time
+        start = time.perf_counter()
+        matches = await asyncio.gather(*[bot(address, '4x4', 1.0, 'alphabeta') for number in range(6)])
+        assert all(match.reason == 'over' for match in matches), [match.reason for match in matches]
+        print('6 games against alphabeta on 2 processes in %.1f seconds' % (time.perf_counter() - start))
+        #a bot that is too slow loses on time
+        slow = await bot(address, '2x2', 0.2, 'heuristic', slow=True)
+        assert slow.reason == 'time' and slow.winner == 1
+        #moves sent out of turn are refused and never played later
+        reader, writer = await asyncio.open_connection(*address)
+        other_reader, other = await asyncio.open_connection(*address)
+        writer.write(b'PLAY 2x2 5\n')
+        await reader.readline()
+        other.write(b'PLAY 2x2 5\n')
+        assert (await reader.readline()).split()[0] == b'START'
+        assert await reader.readline() == b'TURN\n'
+        writer.write(b'MOVE 0\nMOVE 1\n')
+        answers = {await reader.readline(), await reader.readline()}
+        assert answers == {b'MOVED 0 0\n', b'ERROR not your turn\n'}, answers
+        other.close()
+        assert (await reader.readline()).split()[-1] == b'gone'
+        writer.write(b'PLAY 2x2 5 heuristic\n')
+        assert (await reader.readline()).split()[0] == b'START'
+        assert await reader.readline() == b'TURN\n'
+        try:
+            line = await asyncio.wait_for(reader.readline(), 0.5)
+        except asyncio.TimeoutError:
+            line = None
+        assert line is None, line
+        writer.write(b'QUIT\n')
+        assert await reader.readline() == b''
+        writer.close()
+        #a line too long to read and a board too big are refused, and the connection stays
+        reader, writer = await asyncio.open_connection(*address)
+        writer.write(b'PLAY ' + b'9' * (1 << 17) + b'\nPLAY 1000x1000 5\nQUIT\n')
+        answers = []
+        while not answers or answers[-1]:
+            answers.append(await reader.readline())
+        #the rest of the long line can come in as another line or two, refused as well
+        assert answers[0] == b'ERROR line too long\n', answers[:3]
+        assert all(answer.startswith(b'ERROR') for answer in answers[:-1])
+        assert answers[-2].startswith(b'ERROR boards go from'), answers[-3:]
+        writer.close()
+        print('finished games:', server.finished)
+        await server.close()
+
+    asyncio.run(run())
+
+if __name__ == '__main__':
+    main()
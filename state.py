@@ -0,0 +1,358 @@
+'''
+    state.py
+    A headless game state for dots and boxes. It holds no graphics objects, so the AI
+    and batch runs can use it on machines without a display.
+
+    Edges and boxes are numbered in the same scan order as the layout in board.py.
+    For a board with R rows and C columns of boxes, every row of horizontal lines holds
+    C edges and the row of vertical lines under it holds C+1 edges, so there are
+    R*(2C+1)+C edges in total. The edge at layout position [j][i] is
+    (j//2)*(2C+1) + i//2 for a horizontal line and (j//2)*(2C+1) + C + i//2 for a
+    vertical line. The box at layout position [j][i] is (j//2)*C + i//2.
+
+    Boards with more than LEAN_BOXES boxes keep no Python object per edge or box. Their
+    edge and box tables work the numbers out when they are looked up, only the identity
+    symmetry is used for their keys, and the moves are packed into an array. A 100x100
+    board then takes well under 100 bytes a box.
+'''
+from array import array
+from bisect import bisect_right
+from itertools import compress
+import random
+
+import symmetry
+
+
+#boards with more boxes than this use the lean tables
+LEAN_BOXES = 2500
+
+
+class BoxEdges:
+    '''The four edges around each box (top, bottom, left, right), worked out from the box
+        number instead of kept in a table. Used for large boards.
+    '''
+
+    __slots__ = ('columns', 'width', 'size')
+
+    def __init__(self, rows, columns):
+        self.columns = columns
+        self.width = 2 * columns + 1
+        self.size = rows * columns
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, box):
+        if not 0 <= box < self.size:
+            raise IndexError(box)
+        r, c = divmod(box, self.columns)
+        top = r * self.width + c
+        return (top, top + self.width, top + self.columns, top + self.columns + 1)
+
+
+class EdgeBoxes:
+    #the one or two boxes next to each edge in increasing order, worked out the same way
+
+    __slots__ = ('rows', 'columns', 'width', 'size')
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.width = 2 * columns + 1
+        self.size = rows * self.width + columns
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, edge):
+        if not 0 <= edge < self.size:
+            raise IndexError(edge)
+        r, k = divmod(edge, self.width)
+        columns = self.columns
+        if k < columns:
+            #a horizontal line, at the top of the box under it
+            box = r * columns + k
+            if r == 0:
+                return (box,)
+            if r == self.rows:
+                return (box - columns,)
+            return (box - columns, box)
+        #a vertical line, at the left of the box to its right
+        c = k - columns
+        box = r * columns + c
+        if c == 0:
+            return (box,)
+        if c == columns:
+            return (box - 1,)
+        return (box - 1, box)
+
+
+class EdgeSiblings:
+    #for each box next to an edge, the other three edges around it
+
+    __slots__ = ('box_edges', 'edge_boxes')
+
+    def __init__(self, box_edges, edge_boxes):
+        self.box_edges = box_edges
+        self.edge_boxes = edge_boxes
+
+    def __len__(self):
+        return len(self.edge_boxes)
+
+    def __getitem__(self, edge):
+        return tuple(tuple(other for other in self.box_edges[box] if other != edge)
+                     for box in self.edge_boxes[edge])
+
+
+#turns drawn flags into undrawn flags, for legal_moves
+_UNDRAWN = bytes([1, 0]) + bytes(254)
+
+
+class Changes:
+    '''Tells a watcher of a state, like the chain analyzer, which edges were drawn or taken
+        back since it last asked, without comparing the whole board. Every move in the
+        history of the state carries a stamp that is bigger than any stamp before it, so
+        the moves with a stamp no bigger than the last one seen are the ones that were not
+        taken back since. The watcher keeps its own copy of the edges played only for the
+        moves after those.
+    '''
+
+    __slots__ = ('state', 'edges', 'stamp')
+
+    def __init__(self, state):
+        self.state = state
+        #the edges played when last asked, in order, and the stamp of the last of them
+        self.edges = array('l', (move >> 1 for move in state.history))
+        self.stamp = state.stamps[-1] if state.stamps else 0
+
+    def take(self):
+        '''Returns the edges drawn or taken back since the last call, in no order. An
+            edge taken back and drawn again can be in it, even twice.
+        '''
+        state = self.state
+        stamps = state.stamps
+        known = len(self.edges)
+        if len(stamps) >= known and (known == 0 or stamps[known - 1] == self.stamp):
+            same = known
+        else:
+            same = bisect_right(stamps, self.stamp)
+        changed = list(self.edges[same:])
+        del self.edges[same:]
+        for move in state.history[same:]:
+            self.edges.append(move >> 1)
+            changed.append(move >> 1)
+        self.stamp = stamps[-1] if stamps else 0
+        return changed
+
+
+_tables = {}
+
+def build_tables(rows, columns):
+    '''Builds the lookup tables for a board size once and shares them between states.
+        box_edges gives the four edges around each box (top, bottom, left, right),
+        edge_boxes gives the one or two boxes next to each edge and edge_siblings gives,
+        for each of those boxes, the other three edges around it. zobrist gives, for every
+        symmetry of the board, an array with a random 64 bit key for every edge, being the
+        key of the edge the symmetry moves it to. The keys are seeded by the board size so
+        they are the same in every process. permutations and inverses give the symmetries
+        themselves. Large boards get the lean tables described at the top.
+    '''
+    key = (rows, columns)
+    if key in _tables:
+        return _tables[key]
+    width = 2 * columns + 1
+    num_edges = rows * width + columns
+    rng = random.Random('%dx%d' % (rows, columns))
+    if rows * columns > LEAN_BOXES:
+        box_edges = BoxEdges(rows, columns)
+        edge_boxes = EdgeBoxes(rows, columns)
+        identity = range(num_edges)
+        zobrist = (array('Q', (rng.getrandbits(64) for edge in identity)),)
+        tables = (box_edges, edge_boxes, EdgeSiblings(box_edges, edge_boxes), zobrist, [identity], [identity])
+        _tables[key] = tables
+        return tables
+    box_edges = []
+    edge_boxes = [[] for e in range(num_edges)]
+    for r in range(rows):
+        for c in range(columns):
+            top = r * width + c
+            edges = (top, top + width, top + columns, top + columns + 1)
+            for edge in edges:
+                edge_boxes[edge].append(len(box_edges))
+            box_edges.append(edges)
+    edge_siblings = tuple(tuple(tuple(other for other in box_edges[box] if other != edge)
+                                for box in edge_boxes[edge]) for edge in range(num_edges))
+    keys = [rng.getrandbits(64) for edge in range(num_edges)]
+    permutations = symmetry.edge_permutations(rows, columns)
+    zobrist = tuple(array('Q', (keys[moved] for moved in permutation)) for permutation in permutations)
+    inverses = [symmetry.inverse(permutation) for permutation in permutations]
+    tables = (tuple(box_edges), tuple(tuple(boxes) for boxes in edge_boxes), edge_siblings, zobrist,
+              permutations, inverses)
+    _tables[key] = tables
+    return tables
+
+
+class GameState:
+
+    def __init__(self, rows, columns):
+        #rows and columns count boxes here, not the doubled layout values used by Board
+        self.rows = rows
+        self.columns = columns
+        self.width = 2 * columns + 1
+        self.num_edges = rows * self.width + columns
+        self.num_boxes = rows * columns
+        (self.box_edges, self.edge_boxes, self.edge_siblings, self.zobrist,
+         self.permutations, self.inverses) = build_tables(rows, columns)
+
+        #drawn[e] is 1 once edge e has been drawn
+        self.drawn = bytearray(self.num_edges)
+        #the zobrist key of the drawn edges as seen through each symmetry of the board,
+        #the first one is the key of the position itself
+        self.hashes = [0] * len(self.permutations)
+        #-1 while a box is open, otherwise the player who closed it
+        self.owner = array('b', [-1]) * self.num_boxes
+        #the number of drawn sides of each box, kept up to date by play and undo
+        self.sides = array('B', bytes(self.num_boxes))
+        #the number of boxes that are still open
+        self.remaining = self.num_boxes
+        #the number of boxes with fewer than two sides drawn, the junctions of chains.py
+        self.loose = self.num_boxes
+        #the number of boxes each player has closed
+        self.score = [0, 0]
+        #the player to move, 0 or 1
+        self.player = 0
+        #every move as edge * 2 + the player who drew it, so that it can be taken back
+        self.history = array('l')
+        #a number for every move in history that is bigger than any given before, see Changes
+        self.stamps = array('Q')
+        self.serial = 0
+
+    @classmethod
+    def from_moves(cls, rows, columns, moves):
+        #plays a list of edges from the start, to replay a recorded game
+        state = cls(rows, columns)
+        for edge in moves:
+            state.play(edge)
+        return state
+
+    def moves(self):
+        #the edges played so far, in order
+        return [move >> 1 for move in self.history]
+
+    def last_move(self):
+        '''Returns the last move as (edge, player, closed boxes), or None at the start.'''
+        if not self.history:
+            return None
+        move = self.history[-1]
+        edge = move >> 1
+        return edge, move & 1, tuple(box for box in self.edge_boxes[edge] if self.sides[box] == 4)
+
+    def copy(self):
+        '''Returns an independent copy of the state that shares the lookup tables.'''
+        other = GameState.__new__(GameState)
+        other.__dict__.update(self.__dict__)
+        other.owner = array('b', self.owner)
+        other.sides = array('B', self.sides)
+        other.score = list(self.score)
+        other.hashes = list(self.hashes)
+        other.history = array('l', self.history)
+        other.stamps = array('Q', self.stamps)
+        other.drawn = bytearray(self.drawn)
+        return other
+
+    def edge_index(self, j, i):
+        #converts a line position in the board layout to an edge number
+        if j % 2 == 0:
+            return (j // 2) * self.width + i // 2
+        return (j // 2) * self.width + self.columns + i // 2
+
+    def edge_coords(self, edge):
+        #converts an edge number back to its [j][i] position in the board layout
+        r, k = divmod(edge, self.width)
+        if k < self.columns:
+            return 2 * r, 2 * k + 1
+        return 2 * r + 1, 2 * (k - self.columns)
+
+    def box_index(self, j, i):
+        return (j // 2) * self.columns + i // 2
+
+    def box_coords(self, box):
+        r, c = divmod(box, self.columns)
+        return 2 * r + 1, 2 * c + 1
+
+    @property
+    def hash(self):
+        return self.hashes[0]
+
+    def canonical(self):
+        '''Returns the key that is the same for this position and all its mirror images and
+            turns, along with the number of the symmetry that gives it. A move is carried
+            over to that symmetry with permutations and back with inverses.
+        '''
+        hashes = self.hashes
+        best = 0
+        for k in range(1, len(hashes)):
+            if hashes[k] < hashes[best]:
+                best = k
+        return hashes[best], best
+
+    def is_drawn(self, edge):
+        return self.drawn[edge] == 1
+
+    def legal_moves(self):
+        return list(compress(range(self.num_edges), self.drawn.translate(_UNDRAWN)))
+
+    def changes(self):
+        #a new Changes for a watcher of this state
+        return Changes(self)
+
+    def game_over(self):
+        return self.remaining == 0
+
+    def play(self, edge):
+        '''Draws an edge for the player to move and returns a tuple of the boxes it
+            closed. The player keeps the move if a box was closed.
+        '''
+        self.drawn[edge] = 1
+        hashes = self.hashes
+        for k, keys in enumerate(self.zobrist):
+            hashes[k] ^= keys[edge]
+        closed = ()
+        for box in self.edge_boxes[edge]:
+            self.sides[box] += 1
+            if self.sides[box] == 2:
+                self.loose -= 1
+            elif self.sides[box] == 4:
+                closed += (box,)
+                self.owner[box] = self.player
+        self.history.append(edge << 1 | self.player)
+        self.serial += 1
+        self.stamps.append(self.serial)
+        if closed:
+            self.score[self.player] += len(closed)
+            self.remaining -= len(closed)
+        else:
+            self.player = 1 - self.player
+        return closed
+
+    def undo(self):
+        '''Takes back the last move and returns its edge.'''
+        move = self.history.pop()
+        self.stamps.pop()
+        edge = move >> 1
+        player = move & 1
+        self.drawn[edge] = 0
+        hashes = self.hashes
+        for k, keys in enumerate(self.zobrist):
+            hashes[k] ^= keys[edge]
+        #the boxes with four sides next to the last edge were closed by it
+        for box in self.edge_boxes[edge]:
+            if self.sides[box] == 4:
+                self.owner[box] = -1
+                self.score[player] -= 1
+                self.remaining += 1
+            elif self.sides[box] == 2:
+                self.loose += 1
+            self.sides[box] -= 1
+        self.player = player
+        return edge
@@ -0,0 +1,77 @@
+'''
+    symmetry.py
+    The symmetries of a board. Flipping a board left to right or top to bottom, or turning
+    it half way round, gives the same game with the edges moved around, so the AI only has
+    to look at one of those positions. A square board also gives the same game when it
+    is turned a quarter of the way round or mirrored along a diagonal, which makes 8
+    symmetries, while other boards have 4.
+
+    The symmetries work on the layout positions described at the top of board.py. A board
+    with R rows and C columns of boxes has a layout of 2R+1 rows and 2C+1 columns, and a
+    symmetry moves the line at [j][i] to another line position in that layout.
+'''
+
+
+def transforms(rows, columns):
+    '''Returns the symmetries of a board as functions from a layout position to the
+        position it is moved to. The first one leaves every position where it is.
+    '''
+    height = 2 * rows
+    width = 2 * columns
+    found = [lambda j, i: (j, i),
+             lambda j, i: (j, width - i),
+             lambda j, i: (height - j, i),
+             lambda j, i: (height - j, width - i)]
+    if rows == columns:
+        found += [lambda j, i: (i, j),
+                  lambda j, i: (i, height - j),
+                  lambda j, i: (width - i, j),
+                  lambda j, i: (width - i, height - j)]
+    return found
+
+
+def edge_index(rows, columns, j, i):
+    #the same numbering as GameState.edge_index in state.py
+    if j % 2 == 0:
+        return (j // 2) * (2 * columns + 1) + i // 2
+    return (j // 2) * (2 * columns + 1) + columns + i // 2
+
+
+def edge_permutations(rows, columns):
+    '''Returns, for every symmetry, a tuple giving the edge that each edge is moved to.'''
+    width = 2 * columns + 1
+    coords = []
+    for edge in range(rows * width + columns):
+        r, k = divmod(edge, width)
+        if k < columns:
+            coords.append((2 * r, 2 * k + 1))
+        else:
+            coords.append((2 * r + 1, 2 * (k - columns)))
+    return [tuple(edge_index(rows, columns, *transform(j, i)) for j, i in coords)
+            for transform in transforms(rows, columns)]
+
+
+def inverse(permutation):
+    #the permutation that moves every edge back
+    found = [0] * len(permutation)
+    for edge, moved in enumerate(permutation):
+        found[moved] = edge
+    return tuple(found)
+
+
+def testModule(): #shows how many fewer positions the search keeps with canonical keys
+    from state import GameState
+    import search
+
+    for rows, columns, depth in [(3, 3, 4), (4, 4, 3)]:
+        counts = []
+        for symmetric in (False, True):
+            searcher = search.AlphaBeta(symmetric=symmetric)
+            searcher.find_move(GameState(rows, columns), time_limit=600, max_depth=depth)
+            counts.append((len(searcher.table), searcher.nodes))
+        print('%dx%d depth %d: %d entries and %d nodes with plain keys, %d entries and %d nodes with canonical keys'
+              % (rows, columns, depth, counts[0][0], counts[0][1], counts[1][0], counts[1][1]))
+        assert counts[1][0] < counts[0][0]
+
+if __name__ == '__main__':
+    testModule()
@@ -0,0 +1,281 @@
+'''
+    tournament.py
+    Plays many games between two computer players without a window, spread over a pool
+    of processes. Results are added up as games finish, so a long run can be watched
+    while it goes.
+
+    An example run of 200 games on two board sizes using every core:
+        python tournament.py heuristic alphabeta --games 200 --sizes 3x3,5x5 --think 0.1
+
+    Every player of every game gets its own random number generator seeded from the game's
+    seed, so a game can be played again move for move, and a player that draws a different
+    number of random numbers does not change the moves of the other one. Searching players
+    that run out of time can still pick different moves; --playouts gives the mcts player a
+    fixed number of playouts a move instead, so its games can be played again too. With
+    --log every finished game is written as a JSON line, and --replay plays those games
+    again and reports the first move that comes out different. --records keeps the games in the smaller binary format of records.py.
+    --profile writes where the players spent their time, see instrument.py.
+'''
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import json
+import os
+import random
+import time
+
+import instrument
+import players
+import records
+from state import GameState
+
+
+#the games are played in a pool of processes
+STRATEGIES = players.pool_strategies()
+
+
+def player_rngs(seed):
+    #a random number generator for the first and for the second player of a game
+    return tuple(random.Random('%d/%d' % (seed, player)) for player in (0, 1))
+
+
+def play_game(task):
+    '''Plays one game and returns what happened. The task says which players play, who
+        moves first, the board size, the seed and the playouts of the mcts player, if
+        fixed. This runs in a worker process.
+    '''
+    number, first, second, rows, columns, seed, think_time, seats, playouts = task
+    players.new_game()
+    rngs = player_rngs(seed)
+    state = GameState(rows, columns)
+    names = (first, second)
+    latencies = ([], [])
+    while not state.game_over():
+        player = state.player
+        start = time.perf_counter()
+        move = players.find_move(state, names[player], think_time, rngs[player], playouts=playouts)
+        latencies[player].append(time.perf_counter() - start)
+        state.play(move)
+    result = {'game': number, 'players': names, 'seats': seats, 'size': (rows, columns), 'seed': seed,
+              'think': think_time, 'playouts': playouts, 'score': tuple(state.score), 'latencies': latencies,
+              'moves': state.moves()}
+    if instrument.active:
+        result['profile'] = instrument.take()
+    return result
+
+
+def replay_game(record):
+    '''Plays a recorded game again from its seed, asking the same players for every move.
+        Returns the index of the first move that comes out different from the record, or
+        None if all of them are the same. Searching players that ran out of time can pick
+        different moves on a replay, the heuristic player and an mcts player with a fixed
+        number of playouts always pick the same ones.
+    '''
+    rows, columns = record['size']
+    players.new_game()
+    rngs = player_rngs(record['seed'])
+    state = GameState(rows, columns)
+    for index, edge in enumerate(record['moves']):
+        move = players.find_move(state, record['players'][state.player], record['think'], rngs[state.player],
+                                 playouts=record.get('playouts'))
+        if move != edge:
+            return index
+        state.play(edge)
+    return None
+
+
+def make_tasks(player_a, player_b, games, sizes, seed, think_time, playouts=None):
+    '''The players take turns to move first and the board sizes are used in turn. Every
+        task also gives the seats of the first and second player, 0 for player_a and 1 for
+        player_b, so the results are added up right when both play the same strategy.
+    '''
+    for number in range(games):
+        rows, columns = sizes[number % len(sizes)]
+        if number % 2 == 0:
+            first, second, seats = player_a, player_b, (0, 1)
+        else:
+            first, second, seats = player_b, player_a, (1, 0)
+        yield (number, first, second, rows, columns, seed + number, think_time, seats, playouts)
+
+
+#the names of the two seats in the summary, player_a sits in A and player_b in B
+SEATS = ('A', 'B')
+
+
+class Results:
+    '''Adds up the results of finished games: wins, draws, box margins and the time each
+        player took per move. Everything is kept by seat, the strategy names are only
+        labels, so a strategy can play against itself.
+    '''
+
+    def __init__(self, player_a, player_b):
+        self.names = (player_a, player_b)
+        self.games = 0
+        self.wins = [0, 0]
+        self.draws = 0
+        #how many games ended with each margin, counted for seat A
+        self.margins = {}
+        self.latencies = ([], [])
+        #the instrument.py counts added up over the games, when they were collected
+        self.profile = None
+
+    def add(self, result):
+        self.games += 1
+        first, second = result['seats']
+        score = result['score']
+        if score[0] == score[1]:
+            self.draws += 1
+        else:
+            self.wins[first if score[0] > score[1] else second] += 1
+        margin = score[0] - score[1] if first == 0 else score[1] - score[0]
+        self.margins[margin] = self.margins.get(margin, 0) + 1
+        for index, seat in enumerate(result['seats']):
+            self.latencies[seat].extend(result['latencies'][index])
+        if 'profile' in result:
+            self.profile = instrument.merge(self.profile or {}, result['profile'])
+
+    def summary(self):
+        found = {'games': self.games, 'draws': self.draws, 'players': {},
+                 'margins': {str(margin): count for margin, count in sorted(self.margins.items())}}
+        for seat, name in enumerate(self.names):
+            times = sorted(self.latencies[seat])
+            found['players'][SEATS[seat]] = {
+                'name': name,
+                'wins': self.wins[seat],
+                'win_rate': self.wins[seat] / self.games if self.games else 0.0,
+                'moves': len(times),
+                'latency_p50': percentile(times, 50),
+                'latency_p90': percentile(times, 90),
+                'latency_p99': percentile(times, 99),
+                'latency_max': times[-1] if times else 0.0,
+            }
+        if self.profile is not None:
+            found['profile'] = self.profile
+        return found
+
+    def labels(self):
+        #the names to print for the seats, with the seat added when both are the same
+        if self.names[0] == self.names[1]:
+            return tuple('%s (%s)' % (name, seat) for name, seat in zip(self.names, SEATS))
+        return self.names
+
+    def line(self):
+        #a one line progress report
+        a, b = self.labels()
+        return '%d games: %s %d, %s %d, draws %d' % (self.games, a, self.wins[0], b, self.wins[1], self.draws)
+
+
+def percentile(values, percent):
+    #values must be sorted
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def run(player_a, player_b, games, sizes, seed=0, think_time=0.1, workers=None, report=None,
+        profile=False, playouts=None):
+    '''Plays the games over a process pool and returns the Results. Only a few games per
+        worker are handed out at a time, so memory does not grow with the number of games.
+        report, if given, is called with the Results and the result of the game after every
+        finished game. With profile=True every worker counts calls and time with
+        instrument.py, and the counts are added up in the Results. playouts, if given, is
+        the number of playouts of the mcts player for every move instead of think_time.
+    '''
+    for name in (player_a, player_b):
+        if name not in STRATEGIES:
+            raise ValueError("unknown strategy %r, pick one of %s" % (name, ', '.join(STRATEGIES)))
+    workers = workers or os.cpu_count() or 1
+    results = Results(player_a, player_b)
+    tasks = make_tasks(player_a, player_b, games, sizes, seed, think_time, playouts)
+    with ProcessPoolExecutor(max_workers=workers, initializer=instrument.enable if profile else None) as pool:
+        running = set()
+        for task in tasks:
+            running.add(pool.submit(play_game, task))
+            if len(running) >= workers * 2:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.add(future.result())
+                    if report is not None:
+                        report(results, future.result())
+        for future in as_completed(running):
+            results.add(future.result())
+            if report is not None:
+                report(results, future.result())
+    return results
+
+
+def parse_sizes(text):
+    #turns "3x3,5x4" into [(3, 3), (5, 4)]
+    sizes = []
+    for size in text.split(','):
+        rows, columns = size.lower().split('x')
+        sizes.append((int(rows), int(columns)))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play computer players against each other.')
+    parser.add_argument('player_a', nargs='?', choices=STRATEGIES)
+    parser.add_argument('player_b', nargs='?', choices=STRATEGIES)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--sizes', type=parse_sizes, default=[(3, 3)],
+                        help='board sizes in boxes, like 3x3,5x5')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the first game')
+    parser.add_argument('--think', type=float, default=0.1, help='seconds per move for searching players')
+    parser.add_argument('--playouts', type=int, default=None,
+                        help='playouts per move for the mcts player instead of --think, so its games can be replayed')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, all cores by default')
+    parser.add_argument('--json', default=None, help='file to write the summary to')
+    parser.add_argument('--log', default=None, help='file to write every game to, one JSON line each')
+    parser.add_argument('--records', default=None,
+                        help='file to add every game to in the binary format of records.py')
+    parser.add_argument('--profile', default=None,
+                        help='file to write the calls and time of every part of the players to, as JSON')
+    parser.add_argument('--replay', default=None, help='a file written by --log to play again and check')
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay) as games:
+            for line in games:
+                record = json.loads(line)
+                index = replay_game(record)
+                if index is None:
+                    print('game %d (seed %d): same moves' % (record['game'], record['seed']))
+                else:
+                    print('game %d (seed %d): differs at move %d' % (record['game'], record['seed'], index))
+        return
+    if args.player_a is None or args.player_b is None:
+        parser.error('two players are needed unless --replay is given')
+
+    start = time.perf_counter()
+    every = max(1, args.games // 20)
+    log = open(args.log, 'w') if args.log else None
+    writer = records.RecordWriter(args.records) if args.records else None
+    def report(results, result):
+        if log is not None:
+            record = dict(result)
+            del record['latencies']
+            record.pop('profile', None)
+            log.write(json.dumps(record) + '\n')
+        if writer is not None:
+            writer.write(result['size'][0], result['size'][1], result['seed'], result['moves'])
+        if results.games % every == 0:
+            print(results.line())
+    results = run(args.player_a, args.player_b, args.games, args.sizes, args.seed,
+                  args.think, args.workers, report, args.profile is not None, args.playouts)
+    if log is not None:
+        log.close()
+    if writer is not None:
+        writer.close()
+    summary = results.summary()
+    summary['seconds'] = time.perf_counter() - start
+    if args.profile:
+        instrument.dump(args.profile, summary.pop('profile', {}))
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(summary, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()